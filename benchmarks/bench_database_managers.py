@@ -0,0 +1,391 @@
+"""
+Benchmarks the database managers against a synthetic community-sized SQLite file.
+
+Seeds a scratch database (by default 50k users, 1M team logs and 200k misconduct logs), then
+times every public method of the managers in utils/database_managers.py and reports ops/sec
+with p50/p99 latency. Results can be written as JSON to compare runs before and after a change.
+
+Needs the bot's config.py to be importable; the database paths are pointed at the scratch file.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_database_managers
+    python -m benchmarks.bench_database_managers --users 5000 --team-logs 100000 --json before.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import config
+
+TEAMS = ["Unassigned", "Chalk Team", "Red Section", "Grey Section", "Black Section"]
+CATEGORIES = ["Combat", "Conduct", "Communication", "Vehicles"]
+TYPES = ["Teamkill", "Toxicity", "Griefing", "Mic spam", "Vehicle theft", "AFK"]
+WORDS = "teammate vehicle base squad voice chat ignored orders ran over truck helicopter spawn friendly fire insulted objective".split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--team-logs", type=int, default=1_000_000)
+    parser.add_argument("--misconduct-logs", type=int, default=200_000)
+    parser.add_argument(
+        "--iterations", type=int, default=500, help="Calls timed per method"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--db",
+        help="Scratch database path (default: a temporary directory). Reused if it exists.",
+    )
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def use_scratch_database(db_path):
+    # Must run before utils.database_managers is imported: it opens config.USER_DB_PATH
+    config.USER_DB_PATH = db_path
+    config.DB_ARCHIVE_PATH = str(Path(db_path).with_name("bench_archive.db"))
+    config.TEAMS = TEAMS
+
+
+def timestamp(rng, max_days_ago=730):
+    moment = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=rng.randrange(max_days_ago * 86400)
+    )
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def seed(db_path, args, rng):
+    conn = sqlite3.connect(db_path)
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+        print(f"Reusing seeded database {db_path}")
+        conn.close()
+        return
+
+    started = time.perf_counter()
+    users = [
+        (
+            100_000 + idx,
+            f"user{idx}",
+            f"User {idx}",
+            "Active" if rng.random() < 0.8 else "Inactive",
+            rng.choice(TEAMS),
+            timestamp(rng, 90)[:10],
+            f"bohemia-{idx}",
+        )
+        for idx in range(args.users)
+    ]
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)", users)
+
+    def random_user():
+        return 100_000 + rng.randrange(args.users)
+
+    conn.executemany(
+        "INSERT INTO team_logs (instigator_discord_id, target_discord_id, team, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                random_user(),
+                random_user(),
+                rng.choice(TEAMS),
+                "User joined a team",
+                timestamp(rng),
+            )
+            for _ in range(args.team_logs)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO misconduct_logs (instigator_discord_id, target_discord_id, victim_discord_id, category, type, details, severity, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                random_user(),
+                random_user(),
+                random_user() if rng.random() < 0.5 else None,
+                rng.choice(CATEGORIES),
+                rng.choice(TYPES),
+                " ".join(rng.choices(WORDS, k=12)),
+                rng.randrange(3),
+                timestamp(rng),
+            )
+            for _ in range(args.misconduct_logs)
+        ),
+    )
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    print(
+        f"Seeded {args.users} users, {args.team_logs} team logs and {args.misconduct_logs} misconduct logs in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def measure(name, func, iterations):
+    latencies = []
+    for idx in range(iterations):
+        started = time.perf_counter()
+        func(idx)
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "method": name,
+        "iterations": iterations,
+        "ops_per_sec": iterations / total if total else float("inf"),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(int(iterations * 0.99), iterations - 1)] * 1000,
+    }
+
+
+def run_benchmarks(args, rng):
+    from utils.database_managers import (
+        AUDIT_LOG_QUEUE,
+        MISCONDUCT_LOGS_DBM,
+        ROLE_LOGS_DBM,
+        USER_TRANSACTIONS,
+        USERS_DBM,
+    )
+
+    n = args.iterations
+    user_ids = [100_000 + idx for idx in range(args.users)]
+    sample = rng.sample(user_ids, min(len(user_ids), n * 8))
+
+    def user(idx, offset=0):
+        return sample[(idx + offset * n) % len(sample)]
+
+    new_id = 10_000_000
+    now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    benchmarks = [
+        # Users: reads
+        ("users.read", lambda idx: USERS_DBM.read(user(idx))),
+        ("users.read_team", lambda idx: USERS_DBM.read_team(user(idx))),
+        ("users.read_bohemia_id", lambda idx: USERS_DBM.read_bohemia_id(user(idx))),
+        (
+            "users.read_by_bohemia_id",
+            lambda idx: USERS_DBM.read_by_bohemia_id(f"bohemia-{user(idx) - 100_000}"),
+        ),
+        (
+            "users.read_discord_displayname",
+            lambda idx: USERS_DBM.read_discord_displayname(user(idx)),
+        ),
+        ("users.get_team_rosters", lambda idx: USERS_DBM.get_team_rosters(TEAMS)),
+        # Users: writes
+        (
+            "users.update_team",
+            lambda idx: USERS_DBM.update_team(user(idx), TEAMS[idx % len(TEAMS)]),
+        ),
+        (
+            "users.update_status",
+            lambda idx: USERS_DBM.update_status(
+                user(idx), "Active" if idx % 2 else "Inactive"
+            ),
+        ),
+        (
+            "users.update_bohemia_id",
+            lambda idx: USERS_DBM.update_bohemia_id(user(idx), f"bench-{idx}"),
+        ),
+        (
+            "users.touch_last_seen(64 players)",
+            lambda idx: USERS_DBM.touch_last_seen_by_discord_ids(
+                [user(idx * 64 + offset) for offset in range(64)]
+            ),
+        ),
+        (
+            "users.create",
+            lambda idx: USERS_DBM.create(new_id + idx, f"new{idx}", f"New {idx}"),
+        ),
+        ("users.delete", lambda idx: USERS_DBM.delete(new_id + idx)),
+        # Team logs
+        (
+            "team_logs.create",
+            lambda idx: ROLE_LOGS_DBM.create(
+                user(idx), user(idx, 1), "Chalk Team", "x"
+            ),
+        ),
+        (
+            "team_logs.create_many(50)",
+            lambda idx: ROLE_LOGS_DBM.create_many(
+                [(user(idx), user(idx, 1), "Chalk Team", "x", now)] * 50
+            ),
+        ),
+        (
+            "team_logs.read_by_target_discord_id",
+            lambda idx: ROLE_LOGS_DBM.read_by_target_discord_id(user(idx)),
+        ),
+        (
+            "team_logs.read_report_by_target_discord_id",
+            lambda idx: ROLE_LOGS_DBM.read_report_by_target_discord_id(user(idx)),
+        ),
+        (
+            "team_logs.read_report(include_archive)",
+            lambda idx: ROLE_LOGS_DBM.read_report_by_target_discord_id(
+                user(idx), include_archive=True
+            ),
+        ),
+        (
+            "team_logs.mark_as_deleted_by_instigator_discord_id",
+            lambda idx: ROLE_LOGS_DBM.mark_as_deleted_by_instigator_discord_id(
+                user(idx, 2)
+            ),
+        ),
+        (
+            "team_logs.mark_as_deleted_by_target_discord_id",
+            lambda idx: ROLE_LOGS_DBM.mark_as_deleted_by_target_discord_id(
+                user(idx, 2)
+            ),
+        ),
+        # Misconduct logs
+        (
+            "misconduct_logs.create",
+            lambda idx: MISCONDUCT_LOGS_DBM.create(
+                user(idx), user(idx, 1), None, "Combat", "Teamkill", "x", 1
+            ),
+        ),
+        (
+            "misconduct_logs.create_many(50)",
+            lambda idx: MISCONDUCT_LOGS_DBM.create_many(
+                [(user(idx), user(idx, 1), None, "Combat", "Teamkill", "x", 1, now)]
+                * 50
+            ),
+        ),
+        (
+            "misconduct_logs.read_by_target_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.read_by_target_discord_id(user(idx)),
+        ),
+        (
+            "misconduct_logs.read_rollup_by_target_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.read_rollup_by_target_discord_id(user(idx)),
+        ),
+        (
+            "misconduct_logs.read_report_by_target_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.read_report_by_target_discord_id(user(idx)),
+        ),
+        (
+            "misconduct_logs.search",
+            lambda idx: MISCONDUCT_LOGS_DBM.search(
+                f"{WORDS[idx % len(WORDS)]} {WORDS[(idx * 7) % len(WORDS)]}"
+            ),
+        ),
+        (
+            "misconduct_logs.mark_as_deleted_by_instigator_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.mark_as_deleted_by_instigator_discord_id(
+                user(idx, 3)
+            ),
+        ),
+        (
+            "misconduct_logs.mark_as_deleted_by_target_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.mark_as_deleted_by_target_discord_id(
+                user(idx, 3)
+            ),
+        ),
+        (
+            "misconduct_logs.mark_as_deleted_by_victim_discord_id",
+            lambda idx: MISCONDUCT_LOGS_DBM.mark_as_deleted_by_victim_discord_id(
+                user(idx, 3)
+            ),
+        ),
+        # Composite operations
+        (
+            "transactions.change_team",
+            lambda idx: USER_TRANSACTIONS.change_team(
+                user(idx, 4), TEAMS[idx % len(TEAMS)], user(idx, 4), "x"
+            ),
+        ),
+        ("transactions.delete", lambda idx: USER_TRANSACTIONS.delete(user(idx, 5))),
+    ]
+
+    results = [measure(name, func, n) for name, func in benchmarks]
+
+    # Whole-guild operations are timed a few times only
+    members = [
+        (discord_id, username, display_name, None)
+        for discord_id, username, display_name, *_ in USERS_DBM.directory.rows()
+    ]
+    results.append(
+        measure(
+            f"transactions.reconcile({len(members)} members)",
+            lambda idx: USER_TRANSACTIONS.reconcile(members, set(TEAMS[1:])),
+            3,
+        )
+    )
+
+    async def flush_audit_logs():
+        for idx in range(50):
+            AUDIT_LOG_QUEUE.add_team_log(user(idx), user(idx, 1), "Chalk Team", "x")
+        await AUDIT_LOG_QUEUE.flush()
+
+    loop = asyncio.new_event_loop()
+    results.append(
+        measure(
+            "audit_log_queue.flush(50)",
+            lambda idx: loop.run_until_complete(flush_audit_logs()),
+            max(n // 10, 1),
+        )
+    )
+    loop.close()
+
+    return results
+
+
+def print_results(results):
+    width = max(len(result["method"]) for result in results)
+    print(f"{'method':<{width}}  {'ops/sec':>10}  {'p50 ms':>9}  {'p99 ms':>9}")
+    for result in results:
+        print(
+            f"{result['method']:<{width}}  {result['ops_per_sec']:>10.1f}  {result['p50_ms']:>9.3f}  {result['p99_ms']:>9.3f}"
+        )
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    scratch_dir = None
+    if args.db:
+        db_path = args.db
+    else:
+        scratch_dir = tempfile.TemporaryDirectory(prefix="talon-bench-")
+        db_path = str(Path(scratch_dir.name) / "bench.db")
+
+    use_scratch_database(db_path)
+
+    # Importing the managers creates the schema through the migrations
+    from utils.database import close_databases
+    from utils.database_managers import USERS_DBM
+
+    seed(db_path, args, rng)
+    # Pick up the seeded rows in the in-memory user directory
+    USERS_DBM.setup_database()
+
+    print(f"SQLite {sqlite3.sqlite_version}, {args.iterations} iterations per method")
+    results = run_benchmarks(args, rng)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {
+                    "sqlite_version": sqlite3.sqlite_version,
+                    "users": args.users,
+                    "team_logs": args.team_logs,
+                    "misconduct_logs": args.misconduct_logs,
+                    "iterations": args.iterations,
+                    "results": results,
+                },
+                file,
+                indent=4,
+            )
+
+    close_databases()
+    if scratch_dir:
+        scratch_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,44 @@
 import asyncio
+import functools
 import signal
 import sys
+import time
 
 import config
 import discord
 from discord.ext import commands
 from utils import configure_logging, get_logger
+from utils.active_message_scheduler import ACTIVE_MESSAGE_SCHEDULER, PRIORITY_HIGH
 from utils.active_messages import (
+    COMBINED_SERVER_STATUS_MESSAGE_KEY,
+    SERVER_NUMBERS,
+    SERVER_STATUS_COMBINED,
+    SERVER_STATUS_MIN_INTERVAL_SECONDS,
+    SERVER_UTILIZATION_STATUS_MESSAGE_KEY,
+    STATUS_REFRESH_MAX_SECONDS,
+    TEAMS_MEMBERS_STATUS_MESSAGE_KEY,
     ModsActiveMessages,
-    create_or_update_active_players_on_arma_reforger_server_status_message,
+    create_or_update_active_players_on_arma_reforger_server_status_message_util,
+    create_or_update_combined_server_status_message,
     create_or_update_server_utilization_status_message,
     create_or_update_teams_members_status_message,
 )
-from utils.database_managers import ROLE_LOGS_DBM, USERS_DBM
+from utils.cache import ACTIVE_MESSAGES_REGISTRY
+from utils.database import close_databases
+from utils.database_maintenance import DatabaseMaintenance
+from utils.database_managers import (
+    AUDIT_LOG_QUEUE,
+    MISCONDUCT_LOGS_DBM,
+    ROLE_LOGS_DBM,
+    USER_TRANSACTIONS,
+    USERS_DBM,
+)
 from utils.file_watchers import (
     ServerAdminToolsStatsFileWatcher,
     ServerConfigFileWatcher,
 )
 from utils.misc import LoadoutSnapshotter
+from utils.system_monitors import SYSTEM_MONITOR
 from utils.utils import (
     add_player_to_playersgroups,
     remove_player_from_playersgroups,
@@ -29,56 +50,44 @@ class TalonBot(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # File Watchers
-        self.server_config_file_watcher_1 = ServerConfigFileWatcher(
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(1)
-        )
-        self.server_config_file_watcher_2 = ServerConfigFileWatcher(
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(2)
-        )
-        self.server_config_file_watcher_3 = ServerConfigFileWatcher(
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(3)
-        )
-        self.server_stats_file_watcher_1 = ServerAdminToolsStatsFileWatcher(
-            config.GET_ARMAR_SERVERSTATS_FILE_PATH(1)
-        )
-        self.server_stats_file_watcher_2 = ServerAdminToolsStatsFileWatcher(
-            config.GET_ARMAR_SERVERSTATS_FILE_PATH(2)
-        )
-        self.server_stats_file_watcher_3 = ServerAdminToolsStatsFileWatcher(
-            config.GET_ARMAR_SERVERSTATS_FILE_PATH(3)
-        )
+        # File Watchers, one of each per game server
+        self.server_config_file_watchers = {
+            server_number: ServerConfigFileWatcher(
+                config.GET_ARMAR_SERVERCONFIG_FILE_PATH(server_number)
+            )
+            for server_number in SERVER_NUMBERS
+        }
+        self.server_stats_file_watchers = {
+            server_number: ServerAdminToolsStatsFileWatcher(
+                config.GET_ARMAR_SERVERSTATS_FILE_PATH(server_number)
+            )
+            for server_number in SERVER_NUMBERS
+        }
 
         # Snapshotters
-        self.loadout_snapshotter_1 = LoadoutSnapshotter(
-            monitor_dir=config.GET_ARMAR_BLE_DIR_PATH(1), max_snapshots=6
-        )
-        self.loadout_snapshotter_2 = LoadoutSnapshotter(
-            monitor_dir=config.GET_ARMAR_BLE_DIR_PATH(2), max_snapshots=6
-        )
-        self.loadout_snapshotter_3 = LoadoutSnapshotter(
-            monitor_dir=config.GET_ARMAR_BLE_DIR_PATH(3), max_snapshots=6
+        self.loadout_snapshotters = {
+            server_number: LoadoutSnapshotter(
+                monitor_dir=config.GET_ARMAR_BLE_DIR_PATH(server_number),
+                max_snapshots=6,
+            )
+            for server_number in SERVER_NUMBERS
+        }
+
+        # Database upkeep (WAL checkpoints, online backups and audit log archiving)
+        self.database_maintenance = DatabaseMaintenance(
+            USERS_DBM.db, archive_managers=(ROLE_LOGS_DBM, MISCONDUCT_LOGS_DBM)
         )
 
         # Active Messages
-        self.mods_active_messages_1 = ModsActiveMessages(
-            self,
-            config.CHANNEL_IDS["Mods-Server-1"],
-            self.server_config_file_watcher_1,
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(1),
-        )
-        self.mods_active_messages_2 = ModsActiveMessages(
-            self,
-            config.CHANNEL_IDS["Mods-Server-2"],
-            self.server_config_file_watcher_2,
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(2),
-        )
-        self.mods_active_messages_3 = ModsActiveMessages(
-            self,
-            config.CHANNEL_IDS["Mods-Server-3"],
-            self.server_config_file_watcher_3,
-            config.GET_ARMAR_SERVERCONFIG_FILE_PATH(3),
-        )
+        self.mods_active_messages = {
+            server_number: ModsActiveMessages(
+                self,
+                config.CHANNEL_IDS[f"Mods-Server-{server_number}"],
+                self.server_config_file_watchers[server_number],
+                config.GET_ARMAR_SERVERCONFIG_FILE_PATH(server_number),
+            )
+            for server_number in SERVER_NUMBERS
+        }
 
     async def setup_hook(self):
         # Load cogs here
@@ -89,17 +98,22 @@ class TalonBot(commands.Bot):
         await self.load_extension("cogs.log")
 
         # Start file watchers
-        self.server_config_file_watcher_1.start()
-        self.server_config_file_watcher_2.start()
-        self.server_config_file_watcher_3.start()
-        self.server_stats_file_watcher_1.start()
-        self.server_stats_file_watcher_2.start()
-        self.server_stats_file_watcher_3.start()
+        for server_config_file_watcher in self.server_config_file_watchers.values():
+            server_config_file_watcher.start()
+        for server_stats_file_watcher in self.server_stats_file_watchers.values():
+            server_stats_file_watcher.start()
 
         # Start snapshotters
-        self.loadout_snapshotter_1.start()
-        self.loadout_snapshotter_2.start()
-        self.loadout_snapshotter_3.start()
+        for loadout_snapshotter in self.loadout_snapshotters.values():
+            loadout_snapshotter.start()
+
+        # Start database maintenance, the audit log writer and the active message scheduler
+        self.database_maintenance.start()
+        AUDIT_LOG_QUEUE.start()
+        ACTIVE_MESSAGE_SCHEDULER.start()
+
+        # Start sampling system metrics for the server utilization message
+        SYSTEM_MONITOR.start()
 
         # Sync slash commands
         try:
@@ -115,82 +129,151 @@ class TalonBot(commands.Bot):
                 sig, lambda: bot.loop.create_task(self.shutdown())
             )
 
+    async def reconcile_users(self):
+        # Catch up on joins, leaves, renames and team role changes missed while offline
+        role_teams = {team for team, _ in config.TEAMS_ROLES.values() if team}
+        members = {}
+        for guild in self.guilds:
+            if not guild.chunked:
+                await guild.chunk()
+
+            for member in guild.members:
+                if member.bot:
+                    continue
+
+                team = None
+                for role in reversed(member.roles):
+                    if (
+                        role.name in config.TEAMS_ROLES
+                        and config.TEAMS_ROLES[role.name][0]
+                    ):
+                        team = config.TEAMS_ROLES[role.name][0]
+                        break
+
+                members[member.id] = (member.id, member.name, member.display_name, team)
+
+        started = time.perf_counter()
+        changed = await USER_TRANSACTIONS.aio.reconcile(
+            list(members.values()), role_teams
+        )
+        log.info(
+            f"Reconciled {len(members)} guild members with the database: {changed} users updated in {time.perf_counter() - started:.2f}s"
+        )
+
     async def on_ready(self):
         log.info(f"✅ Logged in as {bot.user} (ID: {self.user.id})")
 
-        # Set up active messages
-        await create_or_update_teams_members_status_message(
-            bot, config.CHANNEL_IDS["Stats"], USERS_DBM
-        )
+        try:
+            await self.reconcile_users()
+        except Exception as e:
+            log.error(f"Failed to reconcile guild members with the database: {e}")
 
-        # Set up self-looping active messages
-        armar_active_players = []
-        armar_active_players.append(
-            (
+        # Set up active messages; the scheduler owns every refresh from here on
+        ACTIVE_MESSAGE_SCHEDULER.register(
+            TEAMS_MEMBERS_STATUS_MESSAGE_KEY,
+            functools.partial(
+                create_or_update_teams_members_status_message,
                 bot,
-                config.CHANNEL_IDS["Server Status"],
-                1,
-                self.server_stats_file_watcher_1,
-                self.server_config_file_watcher_1,
+                config.CHANNEL_IDS["Stats"],
                 USERS_DBM,
-            )
+            ),
+            config.CHANNEL_IDS["Stats"],
         )
-        armar_active_players.append(
-            (
-                bot,
+        ACTIVE_MESSAGE_SCHEDULER.mark_dirty(TEAMS_MEMBERS_STATUS_MESSAGE_KEY)
+
+        # Set up self-refreshing active messages; the server status refreshes as soon as a
+        # stats file changes, either as one combined message or concurrently per server
+        if SERVER_STATUS_COMBINED:
+            ACTIVE_MESSAGE_SCHEDULER.register(
+                COMBINED_SERVER_STATUS_MESSAGE_KEY,
+                functools.partial(
+                    create_or_update_combined_server_status_message,
+                    bot,
+                    config.CHANNEL_IDS["Server Status"],
+                    [
+                        (
+                            server_number,
+                            self.server_stats_file_watchers[server_number],
+                            self.server_config_file_watchers[server_number],
+                        )
+                        for server_number in SERVER_NUMBERS
+                    ],
+                    USERS_DBM,
+                ),
                 config.CHANNEL_IDS["Server Status"],
-                2,
-                self.server_stats_file_watcher_2,
-                self.server_config_file_watcher_2,
-                USERS_DBM,
+                interval=STATUS_REFRESH_MAX_SECONDS,
+                min_interval=SERVER_STATUS_MIN_INTERVAL_SECONDS,
             )
-        )
-        armar_active_players.append(
-            (
-                bot,
-                config.CHANNEL_IDS["Server Status"],
-                3,
-                self.server_stats_file_watcher_3,
-                self.server_config_file_watcher_3,
-                USERS_DBM,
+            server_status_message_keys = dict.fromkeys(
+                SERVER_NUMBERS, COMBINED_SERVER_STATUS_MESSAGE_KEY
             )
+        else:
+            server_status_message_keys = {}
+            for server_number in SERVER_NUMBERS:
+                server_status_message_keys[server_number] = (
+                    f"active_players_on_arma_reforger_server_status_message_{server_number}"
+                )
+                ACTIVE_MESSAGE_SCHEDULER.register(
+                    server_status_message_keys[server_number],
+                    functools.partial(
+                        create_or_update_active_players_on_arma_reforger_server_status_message_util,
+                        bot,
+                        config.CHANNEL_IDS["Server Status"],
+                        server_number,
+                        self.server_stats_file_watchers[server_number],
+                        self.server_config_file_watchers[server_number],
+                        USERS_DBM,
+                    ),
+                    config.CHANNEL_IDS["Server Status"],
+                    interval=STATUS_REFRESH_MAX_SECONDS,
+                    min_interval=SERVER_STATUS_MIN_INTERVAL_SECONDS,
+                )
+        for (
+            server_number,
+            server_status_message_key,
+        ) in server_status_message_keys.items():
+            self.server_stats_file_watchers[server_number].subscribe(
+                server_status_message_key,
+                functools.partial(
+                    ACTIVE_MESSAGE_SCHEDULER.mark_dirty, server_status_message_key
+                ),
+            )
+        ACTIVE_MESSAGE_SCHEDULER.register(
+            SERVER_UTILIZATION_STATUS_MESSAGE_KEY,
+            functools.partial(
+                create_or_update_server_utilization_status_message,
+                bot,
+                config.CHANNEL_IDS["Stats"],
+            ),
+            config.CHANNEL_IDS["Stats"],
+            interval=STATUS_REFRESH_MAX_SECONDS,
         )
-        create_or_update_active_players_on_arma_reforger_server_status_message.start(
-            armar_active_players
-        )
-        create_or_update_server_utilization_status_message.start(
-            bot=bot, channel_id=config.CHANNEL_IDS["Stats"]
-        )
-        self.mods_active_messages_1.create_or_update_mod_messages.start()
-        self.mods_active_messages_2.create_or_update_mod_messages.start()
-        self.mods_active_messages_3.create_or_update_mod_messages.start()
+        for server_number, mods_active_messages in self.mods_active_messages.items():
+            ACTIVE_MESSAGE_SCHEDULER.register(
+                f"mods_active_messages_{server_number}",
+                mods_active_messages.create_or_update_mod_messages,
+                mods_active_messages.channel_id,
+                interval=60,
+            )
 
     async def on_member_join(self, user):
         # Check if the member is already registered
         if USERS_DBM.read(user.id):
-            USERS_DBM.update_status(user.id, "Active")
-            ROLE_LOGS_DBM.create(
-                user.id,
-                user.id,
-                "Unassigned",
-                "User has rejoined the server",
-            )
+            await USER_TRANSACTIONS.aio.rejoin(user.id, "User has rejoined the server")
             log.info(f"{user.display_name} is already registered.")
         # register the user in the database
         else:
-            USERS_DBM.create(user.id, user.name, user.display_name)
-            ROLE_LOGS_DBM.create(
+            await USER_TRANSACTIONS.aio.register(
                 user.id,
+                user.name,
+                user.display_name,
                 user.id,
-                "Unassigned",
                 "User has joined the server",
             )
             log.info(f"Registered {user.display_name} in the database.")
 
         # Update the status message
-        await create_or_update_teams_members_status_message(
-            bot, config.CHANNEL_IDS["Stats"], USERS_DBM
-        )
+        ACTIVE_MESSAGE_SCHEDULER.mark_dirty(TEAMS_MEMBERS_STATUS_MESSAGE_KEY)
 
     async def on_member_update(self, before, after):
         member = after
@@ -199,17 +282,15 @@ class TalonBot(commands.Bot):
 
         # Check if the member has agreed to the rules
         if before.pending and not after.pending:
-            old_team = USERS_DBM.read_team(member.id)
             role = guild.get_role(1350899518773919908)
             await member.add_roles(role)
 
-            if old_team == "Unassigned":
-                USERS_DBM.update_team(member.id, "Green Team")
-            ROLE_LOGS_DBM.create(
-                member.id,
+            await USER_TRANSACTIONS.aio.change_team(
                 member.id,
                 "Green Team",
+                member.id,
                 "User joined himself/herself as a Green Team member",
+                from_team="Unassigned",
             )
 
         # Check for role changes
@@ -228,7 +309,7 @@ class TalonBot(commands.Bot):
                         USERS_DBM.read_team(member.id)
                         == config.TEAMS_ROLES[role.name][0]
                     ):
-                        USERS_DBM.update_team(member.id, "Unassigned")
+                        await USERS_DBM.aio.update_team(member.id, "Unassigned")
 
                     if not user_bohemia_id:
                         await send_embed(
@@ -238,27 +319,18 @@ class TalonBot(commands.Bot):
                         )
                         continue
 
-                    remove_player_from_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(1),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
-                    remove_player_from_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(2),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
-                    remove_player_from_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(3),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
+                    for server_number in SERVER_NUMBERS:
+                        remove_player_from_playersgroups(
+                            config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(server_number),
+                            config.TEAMS_ROLES[role.name][1],
+                            user_bohemia_id,
+                        )
 
             for role in added_roles:
                 # Update team if the role is in TEAMS_ROLES
                 if role.name in config.TEAMS_ROLES:
                     if config.TEAMS_ROLES[role.name][0]:
-                        USERS_DBM.update_team(
+                        await USERS_DBM.aio.update_team(
                             member.id, config.TEAMS_ROLES[role.name][0]
                         )
 
@@ -270,46 +342,26 @@ class TalonBot(commands.Bot):
                         )
                         continue
 
-                    add_player_to_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(1),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
-                    add_player_to_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(2),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
-                    add_player_to_playersgroups(
-                        config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(3),
-                        config.TEAMS_ROLES[role.name][1],
-                        user_bohemia_id,
-                    )
+                    for server_number in SERVER_NUMBERS:
+                        add_player_to_playersgroups(
+                            config.GET_ARMAR_PLAYERSGROUPS_FILE_PATH(server_number),
+                            config.TEAMS_ROLES[role.name][1],
+                            user_bohemia_id,
+                        )
 
     async def on_member_remove(self, user):
-        USERS_DBM.update_status(user.id, "Inactive")
-        USERS_DBM.update_team(user.id, "Unassigned")
-        ROLE_LOGS_DBM.create(
-            user.id,
-            user.id,
-            "Unassigned",
-            "User has left the server",
-        )
-        await create_or_update_teams_members_status_message(
-            bot, config.CHANNEL_IDS["Stats"], USERS_DBM
-        )
+        await USER_TRANSACTIONS.aio.leave(user.id, "User has left the server")
+        ACTIVE_MESSAGE_SCHEDULER.mark_dirty(TEAMS_MEMBERS_STATUS_MESSAGE_KEY)
 
     async def on_message(self, message):
         if message.author.bot:
             return
 
         # Mod related message
-        if message.channel.id == config.CHANNEL_IDS["Mods-Server-1"]:
-            await self.mods_active_messages_1.handle_message(message)
-        elif message.channel.id == config.CHANNEL_IDS["Mods-Server-2"]:
-            await self.mods_active_messages_2.handle_message(message)
-        elif message.channel.id == config.CHANNEL_IDS["Mods-Server-3"]:
-            await self.mods_active_messages_3.handle_message(message)
+        for mods_active_messages in self.mods_active_messages.values():
+            if message.channel.id == mods_active_messages.channel_id:
+                await mods_active_messages.handle_message(message)
+                break
 
     async def on_interaction(self, interaction):
         if interaction.data and "custom_id" in interaction.data:
@@ -331,9 +383,9 @@ class TalonBot(commands.Bot):
                 # Acknowledge the button press
                 await interaction.response.defer(ephemeral=True)
 
-                # Call the update function
-                await create_or_update_teams_members_status_message(
-                    bot, config.CHANNEL_IDS["Stats"], USERS_DBM
+                # Ask for a refresh ahead of the periodic ones
+                ACTIVE_MESSAGE_SCHEDULER.mark_dirty(
+                    TEAMS_MEMBERS_STATUS_MESSAGE_KEY, PRIORITY_HIGH
                 )
             # Update Status Message
             if (
@@ -343,23 +395,16 @@ class TalonBot(commands.Bot):
                 # Acknowledge the button press
                 await interaction.response.defer(ephemeral=True)
 
-                # Call the update function
-                await create_or_update_server_utilization_status_message(
-                    bot, config.CHANNEL_IDS["Stats"]
+                # Ask for a refresh ahead of the periodic ones
+                ACTIVE_MESSAGE_SCHEDULER.mark_dirty(
+                    SERVER_UTILIZATION_STATUS_MESSAGE_KEY, PRIORITY_HIGH
                 )
 
             # Mod related interactions
-            if interaction.channel_id == config.CHANNEL_IDS["Mods-Server-1"]:
-                await interaction.response.defer(ephemeral=True)
-                await self.mods_active_messages_1.handle_interaction(interaction)
-
-            if interaction.channel_id == config.CHANNEL_IDS["Mods-Server-2"]:
-                await interaction.response.defer(ephemeral=True)
-                await self.mods_active_messages_2.handle_interaction(interaction)
-
-            if interaction.channel_id == config.CHANNEL_IDS["Mods-Server-3"]:
-                await interaction.response.defer(ephemeral=True)
-                await self.mods_active_messages_3.handle_interaction(interaction)
+            for mods_active_messages in self.mods_active_messages.values():
+                if interaction.channel_id == mods_active_messages.channel_id:
+                    await interaction.response.defer(ephemeral=True)
+                    await mods_active_messages.handle_interaction(interaction)
 
     async def on_raw_reaction_add(self, payload):
         # Get information from the payload
@@ -376,22 +421,18 @@ class TalonBot(commands.Bot):
             and message_id == 1366811865094553691
             and emoji.name == "🟩"
         ):
-            old_team = USERS_DBM.read_team(user_id)
             role = guild.get_role(1350899518773919908)
             await member.add_roles(role)
 
-            if old_team == "Unassigned":
-                USERS_DBM.update_team(user_id, "Green Team")
-            ROLE_LOGS_DBM.create(
-                user_id,
+            await USER_TRANSACTIONS.aio.change_team(
                 user_id,
                 "Green Team",
+                user_id,
                 "User joined himself/herself as a Green Team member",
+                from_team="Unassigned",
             )
 
-            await create_or_update_teams_members_status_message(
-                bot, config.CHANNEL_IDS["Stats"], USERS_DBM
-            )
+            ACTIVE_MESSAGE_SCHEDULER.mark_dirty(TEAMS_MEMBERS_STATUS_MESSAGE_KEY)
 
     async def shutdown(self):
         log.info("Shutdown initiated")
@@ -402,12 +443,17 @@ class TalonBot(commands.Bot):
         # self.server_config_file_watcher_test.stop()
 
         # Stop snapshotters
-        self.loadout_snapshotter_1.stop()
-        self.loadout_snapshotter_2.stop()
-        self.loadout_snapshotter_3.stop()
+        for loadout_snapshotter in self.loadout_snapshotters.values():
+            loadout_snapshotter.stop()
+
+        await ACTIVE_MESSAGE_SCHEDULER.stop()
+        ACTIVE_MESSAGES_REGISTRY.save()
+        SYSTEM_MONITOR.stop()
 
         # Shutdown database connections
-        # TODO: Implement database shutdown logic
+        await AUDIT_LOG_QUEUE.stop()
+        self.database_maintenance.stop()
+        close_databases()
 
         await bot.close()
 
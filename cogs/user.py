@@ -4,23 +4,69 @@ from discord.ext import commands
 
 import config
 
-from utils.database_managers import USERS_DBM, ROLE_LOGS_DBM, MISCONDUCT_LOGS_DBM
+from utils.database_managers import (
+    AUDIT_LOG_QUEUE,
+    MISCONDUCT_LOGS_DBM,
+    ROLE_LOGS_DBM,
+    USER_TRANSACTIONS,
+    USERS_DBM,
+)
 from utils.cache import ACTIVE_PLAYERS_BOHEMIA_ID_CACHE
 from utils.active_messages import create_or_update_teams_members_status_message
 from utils.utils import (
     add_player_to_playersgroups,
     remove_player_from_playersgroups,
 )
+from utils.views import PaginatorView, offset_next_cursor
+
+SEVERITY_NAMES = {0: "Green", 1: "Yellow", 2: "Red"}
+
+# Keep report pages inside Discord's limits (1024 characters per field, 6000 per embed)
+REPORT_PAGE_SIZE = 5
+REPORT_DETAILS_MAX_LENGTH = 800
+
+
+def make_misconduct_report_embed(title, rows, page_number):
+    embed = discord.Embed(title=title, color=discord.Color.red())
+    for (
+        _,
+        instigator_name,
+        target_name,
+        victim_name,
+        category,
+        type,
+        details,
+        severity,
+        timestamp,
+    ) in rows:
+        embed.add_field(
+            name=f"{timestamp} | {category} | {type}",
+            value=f"Initiator: {instigator_name or 'N/A'}\nAccused: {target_name or 'N/A'}\nVictim: {victim_name or 'N/A'}\nSeverity: {SEVERITY_NAMES.get(severity, severity)}\nDetails: {details[:REPORT_DETAILS_MAX_LENGTH]}",
+            inline=False,
+        )
+    if not rows:
+        embed.description = "No misconducts found."
+    embed.set_footer(text=f"Page {page_number}")
+    return embed
 
 
 class UserCog(commands.Cog):
     def __init__(
-        self, bot, users_dbm, role_logs_dbm, misconduct_logs_dbm, bohemia_id_cache
+        self,
+        bot,
+        users_dbm,
+        role_logs_dbm,
+        misconduct_logs_dbm,
+        audit_log_queue,
+        user_transactions,
+        bohemia_id_cache,
     ):
         self.bot = bot
         self.users_dbm = users_dbm
         self.role_logs_dbm = role_logs_dbm
         self.misconduct_logs_dbm = misconduct_logs_dbm
+        self.audit_log_queue = audit_log_queue
+        self.user_transactions = user_transactions
         self.bohemia_id_cache = bohemia_id_cache
 
     # Slash Command: /register
@@ -30,9 +76,12 @@ class UserCog(commands.Cog):
     async def register(self, interaction: discord.Interaction):
         user = interaction.user
 
-        self.users_dbm.create(user.id, user.name, user.display_name)
-        self.role_logs_dbm.create(
-            user.id, user.id, "Unassigned", "User registered himself/herself"
+        await self.user_transactions.aio.register(
+            user.id,
+            user.name,
+            user.display_name,
+            user.id,
+            "User registered himself/herself",
         )
         await interaction.response.send_message(
             f"Registered {user.name} in the database.", ephemeral=True
@@ -50,9 +99,12 @@ class UserCog(commands.Cog):
             )
             return
 
-        self.users_dbm.create(user.id, user.name, user.display_name)
-        self.role_logs_dbm.create(
-            interaction.user.id, user.id, "Unassigned", "User was registered by admin"
+        await self.user_transactions.aio.register(
+            user.id,
+            user.name,
+            user.display_name,
+            interaction.user.id,
+            "User was registered by admin",
         )
         await interaction.response.send_message(
             f"Registered {user.name} in the database.", ephemeral=True
@@ -70,12 +122,10 @@ class UserCog(commands.Cog):
             )
             return
 
-        self.users_dbm.delete(user.id)
-        self.role_logs_dbm.mark_as_deleted_by_instigator_discord_id(user.id)
-        self.role_logs_dbm.mark_as_deleted_by_target_discord_id(user.id)
-        self.misconduct_logs_dbm.mark_as_deleted_by_instigator_discord_id(user.id)
-        self.misconduct_logs_dbm.mark_as_deleted_by_target_discord_id(user.id)
-        self.misconduct_logs_dbm.mark_as_deleted_by_victim_discord_id(user.id)
+        # Pending logs must be written before they are anonymised below
+        await self.audit_log_queue.flush()
+
+        await self.user_transactions.aio.delete(user.id)
         await interaction.response.send_message(
             f"Deleted {user.name} from the database.", ephemeral=True
         )
@@ -84,9 +134,15 @@ class UserCog(commands.Cog):
     @app_commands.command(
         name="show_user_team_logs", description="Show a user's team logs"
     )
-    @app_commands.describe(user="The user to show logs for")
+    @app_commands.describe(
+        user="The user to show logs for",
+        full_history="Also include archived logs",
+    )
     async def show_user_team_logs(
-        self, interaction: discord.Interaction, user: discord.User
+        self,
+        interaction: discord.Interaction,
+        user: discord.User,
+        full_history: bool = False,
     ):
         if interaction.user.id not in config.ADMIN_IDS:
             await interaction.response.send_message(
@@ -94,13 +150,33 @@ class UserCog(commands.Cog):
             )
             return
 
-        message = ""
-        for entry in ROLE_LOGS_DBM.read_by_target_discord_id(user.id):
-            user_a_discord_displayname = USERS_DBM.read_discord_displayname(entry[1])
-            user_b_discord_displayname = USERS_DBM.read_discord_displayname(entry[2])
-            message += f"User A: {user_a_discord_displayname}, User B: {user_b_discord_displayname}, Team: {entry[3]}, Details: {entry[4]}, Timestamp: {entry[5]}\n"
+        # Make sure logs still waiting in the write-behind queue show up
+        await self.audit_log_queue.flush()
+
+        async def fetch_page(before_id, limit):
+            return await self.role_logs_dbm.aio.read_report_by_target_discord_id(
+                user.id, before_id, limit, include_archive=full_history
+            )
+
+        def make_embed(rows, page_number):
+            embed = discord.Embed(
+                title=f"Team Logs: {user.display_name}",
+                color=discord.Color.blue(),
+            )
+            for _, instigator_name, target_name, team, details, timestamp in rows:
+                embed.add_field(
+                    name=f"{timestamp} | {team}",
+                    value=f"By: {instigator_name or 'N/A'}\nUser: {target_name or 'N/A'}\nDetails: {details[:REPORT_DETAILS_MAX_LENGTH]}",
+                    inline=False,
+                )
+            if not rows:
+                embed.description = "No team logs found."
+            embed.set_footer(text=f"Page {page_number}")
+            return embed
 
-        await interaction.response.send_message(message)
+        await PaginatorView(
+            interaction.user.id, fetch_page, make_embed, page_size=REPORT_PAGE_SIZE
+        ).send(interaction)
 
     # Slash Command: /link_user_bohemia_id
     @app_commands.command(
@@ -119,7 +195,7 @@ class UserCog(commands.Cog):
             )
             return
 
-        USERS_DBM.update_bohemia_id(user.id, in_game_name)
+        await USERS_DBM.aio.update_bohemia_id(user.id, in_game_name)
         self.bohemia_id_cache.add_known_player(user.id, in_game_name)
         self.bohemia_id_cache.remove_unknown_player(in_game_name)
         await interaction.response.send_message(
@@ -140,10 +216,11 @@ class UserCog(commands.Cog):
 
 
 class MisconductCog(commands.Cog):
-    def __init__(self, bot, users_dbm, misconduct_logs_dbm):
+    def __init__(self, bot, users_dbm, misconduct_logs_dbm, audit_log_queue):
         self.bot = bot
         self.users_dbm = users_dbm
         self.misconduct_logs_dbm = misconduct_logs_dbm
+        self.audit_log_queue = audit_log_queue
 
     # Slash Command: /add_misconduct
     @app_commands.command(
@@ -185,7 +262,7 @@ class MisconductCog(commands.Cog):
             return
 
         victim_id = victim_user.id if victim_user else None
-        self.misconduct_logs_dbm.create(
+        self.audit_log_queue.add_misconduct_log(
             interaction.user.id,
             target_user.id,
             victim_id,
@@ -230,9 +307,15 @@ class MisconductCog(commands.Cog):
     @app_commands.command(
         name="show_misconducts", description="Show a user's misconduct logs"
     )
-    @app_commands.describe(user="The user to show misconducts for")
+    @app_commands.describe(
+        user="The user to show misconducts for",
+        full_history="Also include archived misconducts",
+    )
     async def show_misconducts(
-        self, interaction: discord.Interaction, user: discord.User
+        self,
+        interaction: discord.Interaction,
+        user: discord.User,
+        full_history: bool = False,
     ):
         if interaction.user.id not in config.ADMIN_IDS:
             await interaction.response.send_message(
@@ -240,22 +323,64 @@ class MisconductCog(commands.Cog):
             )
             return
 
-        message = ""
-        for entry in self.misconduct_logs_dbm.read_by_target_discord_id(user.id):
-            user_a_discord_displayname = self.users_dbm.read_discord_displayname(
-                entry[1]
+        # Make sure logs still waiting in the write-behind queue show up
+        await self.audit_log_queue.flush()
+
+        rollup = await self.misconduct_logs_dbm.aio.read_rollup_by_target_discord_id(
+            user.id
+        )
+
+        async def fetch_page(before_id, limit):
+            return await self.misconduct_logs_dbm.aio.read_report_by_target_discord_id(
+                user.id, before_id, limit, include_archive=full_history
+            )
+
+        def make_embed(rows, page_number):
+            embed = make_misconduct_report_embed(
+                f"Misconducts: {user.display_name}", rows, page_number
             )
-            user_b_discord_displayname = self.users_dbm.read_discord_displayname(
-                entry[2]
+            if rollup:
+                green_count, yellow_count, red_count, total_count, last_timestamp = (
+                    rollup
+                )
+                embed.description = f"Total: {total_count} | Green: {green_count} | Yellow: {yellow_count} | Red: {red_count} | Last: {last_timestamp}"
+            return embed
+
+        await PaginatorView(
+            interaction.user.id, fetch_page, make_embed, page_size=REPORT_PAGE_SIZE
+        ).send(interaction)
+
+    # Slash Command: /search_misconducts
+    @app_commands.command(
+        name="search_misconducts",
+        description="Search misconduct logs by details, type or category",
+    )
+    @app_commands.describe(query="Words to look for, e.g. teamkill vehicle")
+    async def search_misconducts(self, interaction: discord.Interaction, query: str):
+        if interaction.user.id not in config.ADMIN_IDS:
+            await interaction.response.send_message(
+                "You don't have permission to use this command.", ephemeral=True
             )
-            user_c_discord_displayname = (
-                self.users_dbm.read_discord_displayname(entry[3])
-                if entry[3] is not None
-                else "N/A"
+            return
+
+        # Make sure logs still waiting in the write-behind queue show up
+        await self.audit_log_queue.flush()
+
+        async def fetch_page(offset, limit):
+            return await self.misconduct_logs_dbm.aio.search(query, offset or 0, limit)
+
+        def make_embed(rows, page_number):
+            return make_misconduct_report_embed(
+                f"Misconduct search: {query}"[:256], rows, page_number
             )
-            message += f"Initiator: {user_a_discord_displayname}\nAccused: {user_b_discord_displayname}\nVictim: {user_c_discord_displayname}\nCategory: {entry[4]}\nType: {entry[5]}\nDetails: {entry[6]}\nSeverity: {entry[7]}\nTimestamp: {entry[8]}\n\n"
 
-        await interaction.response.send_message(message)
+        await PaginatorView(
+            interaction.user.id,
+            fetch_page,
+            make_embed,
+            page_size=REPORT_PAGE_SIZE,
+            next_cursor=offset_next_cursor,
+        ).send(interaction)
 
 
 async def setup(bot):
@@ -265,7 +390,11 @@ async def setup(bot):
             USERS_DBM,
             ROLE_LOGS_DBM,
             MISCONDUCT_LOGS_DBM,
+            AUDIT_LOG_QUEUE,
+            USER_TRANSACTIONS,
             ACTIVE_PLAYERS_BOHEMIA_ID_CACHE,
         )
     )
-    await bot.add_cog(MisconductCog(bot, USERS_DBM, MISCONDUCT_LOGS_DBM))
+    await bot.add_cog(
+        MisconductCog(bot, USERS_DBM, MISCONDUCT_LOGS_DBM, AUDIT_LOG_QUEUE)
+    )
@@ -0,0 +1,367 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import time
+
+import config
+
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+# Discord allows about 5 message edits per 5 seconds in a channel
+ACTIVE_MESSAGE_EDITS_PER_CHANNEL = getattr(
+    config, "ACTIVE_MESSAGE_EDITS_PER_CHANNEL", 5
+)
+ACTIVE_MESSAGE_EDIT_WINDOW_SECONDS = getattr(
+    config, "ACTIVE_MESSAGE_EDIT_WINDOW_SECONDS", 5
+)
+# How many active messages may refresh at the same time, and how long one refresh may take
+ACTIVE_MESSAGE_MAX_CONCURRENT_REFRESHES = getattr(
+    config, "ACTIVE_MESSAGE_MAX_CONCURRENT_REFRESHES", 3
+)
+ACTIVE_MESSAGE_REFRESH_TIMEOUT_SECONDS = getattr(
+    config, "ACTIVE_MESSAGE_REFRESH_TIMEOUT_SECONDS", 30
+)
+# How often the render and edit latency of every message is logged; None to only log on stop
+ACTIVE_MESSAGE_STATS_LOG_INTERVAL_SECONDS = getattr(
+    config, "ACTIVE_MESSAGE_STATS_LOG_INTERVAL_SECONDS", 3600
+)
+
+# Lower runs first
+PRIORITY_HIGH = 0  # A user asked for it, e.g. a refresh button
+PRIORITY_NORMAL = 1  # Something changed, e.g. a member joined
+PRIORITY_LOW = 2  # Periodic refresh
+
+# Key of the active message being refreshed by the scheduler, used to attribute edit latency
+_current_key = contextvars.ContextVar("active_message_key", default=None)
+
+
+class ActiveMessage:
+    def __init__(
+        self, key, refresh, channel_id, priority, interval, timeout, min_interval
+    ):
+        self.key = key
+        self.refresh = refresh
+        self.channel_id = channel_id
+        self.priority = priority
+        self.interval = interval
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.next_due = time.monotonic() if interval else None
+        self.last_started = None
+
+        self.refreshes = 0
+        self.edits = 0
+        # Edits skipped because the message would not have changed
+        self.skipped_edits = 0
+        self.failures = 0
+        self.timeouts = 0
+        # Edit time of the refresh in progress, kept apart from its render time
+        self.current_edit_seconds = 0.0
+        self.last_render_seconds = 0.0
+        self.max_render_seconds = 0.0
+        self.last_edit_seconds = 0.0
+        self.max_edit_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def stats(self):
+        return {
+            "refreshes": self.refreshes,
+            "edits": self.edits,
+            "skipped_edits": self.skipped_edits,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "last_render_ms": round(self.last_render_seconds * 1000, 1),
+            "max_render_ms": round(self.max_render_seconds * 1000, 1),
+            "last_edit_ms": round(self.last_edit_seconds * 1000, 1),
+            "max_edit_ms": round(self.max_edit_seconds * 1000, 1),
+            "max_queue_ms": round(self.max_queue_seconds * 1000, 1),
+        }
+
+
+class ActiveMessageScheduler:
+    """
+    Owns the refresh of every active message.
+
+    Each message is registered once with a refresh coroutine function; callers then only call
+    mark_dirty(key). Requests for the same message are coalesced until it is refreshed, dirty
+    messages start in priority order with up to max_concurrent refreshes running at once (a
+    message never runs twice at the same time), and messages with an interval are marked
+    dirty periodically. A refresh that takes longer than its timeout is cancelled, so one slow
+    Discord call cannot hold the others back. Message edits wait for a slot in their channel's
+    edit window (see acquire_edit), and a message whose channel has no free slot is passed over
+    for one that can go now. Render and edit latency are tracked per message, available at any
+    time from stats() and logged every stats_log_interval seconds.
+    """
+
+    def __init__(
+        self,
+        edits_per_channel=ACTIVE_MESSAGE_EDITS_PER_CHANNEL,
+        edit_window_seconds=ACTIVE_MESSAGE_EDIT_WINDOW_SECONDS,
+        max_concurrent=ACTIVE_MESSAGE_MAX_CONCURRENT_REFRESHES,
+        timeout=ACTIVE_MESSAGE_REFRESH_TIMEOUT_SECONDS,
+        stats_log_interval=ACTIVE_MESSAGE_STATS_LOG_INTERVAL_SECONDS,
+    ):
+        self.edits_per_channel = edits_per_channel
+        self.edit_window_seconds = edit_window_seconds
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.stats_log_interval = stats_log_interval
+
+        self._messages = {}
+        # key -> (priority, time.monotonic() when first marked)
+        self._dirty = {}
+        # channel_id -> time.monotonic() of the recent edits in that channel
+        self._edit_times = collections.defaultdict(collections.deque)
+        # key -> task of the refreshes in progress
+        self._running = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._next_stats_log = None
+
+    def register(
+        self,
+        key,
+        refresh,
+        channel_id,
+        priority=PRIORITY_NORMAL,
+        interval=None,
+        timeout=None,
+        min_interval=None,
+    ):
+        """
+        Registers (or replaces) an active message. refresh is called without arguments.
+        With interval (seconds) the message is also refreshed at PRIORITY_LOW once it has gone
+        that long without a refresh, starting right away. With min_interval (seconds) refreshes
+        below PRIORITY_HIGH start at most that often, however often the message is marked dirty.
+        timeout (seconds) defaults to the scheduler's.
+        """
+        self._messages[key] = ActiveMessage(
+            key,
+            refresh,
+            channel_id,
+            priority,
+            interval,
+            self.timeout if timeout is None else timeout,
+            min_interval,
+        )
+        self._wakeup.set()
+
+    def unregister(self, key):
+        """
+        Drops an active message and its pending refresh; a refresh in progress is left to finish.
+        """
+        self._messages.pop(key, None)
+        self._dirty.pop(key, None)
+
+    def mark_dirty(self, key, priority=None):
+        message = self._messages.get(key)
+        if message is None:
+            log.warning(f"Active message {key} is not registered")
+            return
+
+        priority = message.priority if priority is None else priority
+        if key in self._dirty:
+            priority = min(priority, self._dirty[key][0])
+            self._dirty[key] = (priority, self._dirty[key][1])
+        else:
+            self._dirty[key] = (priority, time.monotonic())
+        self._wakeup.set()
+
+    def set_interval(self, seconds, key=None):
+        """
+        Changes the periodic interval of a message, by default of the one being refreshed.
+        The next periodic refresh is rescheduled from the start of the last refresh.
+        """
+        message = self._messages.get(_current_key.get() if key is None else key)
+        if message is None:
+            return
+
+        message.interval = seconds
+        message.next_due = (message.last_started or time.monotonic()) + seconds
+        self._wakeup.set()
+
+    def _edit_delay(self, channel_id):
+        edit_times = self._edit_times[channel_id]
+        now = time.monotonic()
+        while edit_times and now - edit_times[0] >= self.edit_window_seconds:
+            edit_times.popleft()
+
+        if len(edit_times) < self.edits_per_channel:
+            return 0.0
+
+        return edit_times[0] + self.edit_window_seconds - now
+
+    async def acquire_edit(self, channel_id):
+        """
+        Waits for a free edit slot in the channel and takes it. Used right before message.edit.
+        """
+        while (delay := self._edit_delay(channel_id)) > 0:
+            await asyncio.sleep(delay)
+
+        self._edit_times[channel_id].append(time.monotonic())
+
+    def record_edit(self, seconds):
+        """
+        Attributes the latency of a message edit to the message being refreshed, if any.
+        """
+        message = self._messages.get(_current_key.get())
+        if message is None:
+            return
+
+        message.edits += 1
+        message.last_edit_seconds = seconds
+        message.max_edit_seconds = max(message.max_edit_seconds, seconds)
+        message.current_edit_seconds += seconds
+
+    def _log_stats_if_due(self):
+        if self._next_stats_log is None or time.monotonic() < self._next_stats_log:
+            return
+
+        self._next_stats_log = time.monotonic() + self.stats_log_interval
+        log.info(f"Active message stats: {self.stats()}")
+
+    def record_skipped_edit(self):
+        """
+        Counts an edit of the message being refreshed, if any, that was skipped as unchanged.
+        """
+        message = self._messages.get(_current_key.get())
+        if message is not None:
+            message.skipped_edits += 1
+
+    def _mark_due(self):
+        now = time.monotonic()
+        for message in self._messages.values():
+            if message.next_due is not None and message.next_due <= now:
+                message.next_due = now + message.interval
+                if message.key not in self._dirty:
+                    self._dirty[message.key] = (PRIORITY_LOW, now)
+
+    def _throttle_delay(self, key, priority):
+        message = self._messages[key]
+        if (
+            priority == PRIORITY_HIGH
+            or message.min_interval is None
+            or message.last_started is None
+        ):
+            return 0.0
+
+        return message.last_started + message.min_interval - time.monotonic()
+
+    def _start_delay(self, key, priority):
+        return max(
+            self._edit_delay(self._messages[key].channel_id),
+            self._throttle_delay(key, priority),
+        )
+
+    def _next_key(self):
+        ready = [
+            (priority, marked_at, key)
+            for key, (priority, marked_at) in self._dirty.items()
+            if key not in self._running and self._start_delay(key, priority) <= 0
+        ]
+        return min(ready)[2] if ready else None
+
+    def _next_wakeup_delay(self):
+        now = time.monotonic()
+        delays = [
+            message.next_due - now
+            for message in self._messages.values()
+            if message.next_due is not None
+        ]
+        if self._next_stats_log is not None:
+            delays.append(self._next_stats_log - now)
+        delays.extend(
+            self._start_delay(key, priority)
+            for key, (priority, _) in self._dirty.items()
+            if key not in self._running
+        )
+        return max(min(delays), 0) if delays else None
+
+    async def _refresh(self, key, marked_at):
+        message = self._messages[key]
+
+        started = time.monotonic()
+        message.max_queue_seconds = max(message.max_queue_seconds, started - marked_at)
+        message.current_edit_seconds = 0.0
+
+        # Runs in its own task, so the key only applies to this refresh
+        _current_key.set(key)
+        try:
+            await asyncio.wait_for(message.refresh(), timeout=message.timeout)
+        except asyncio.TimeoutError:
+            message.failures += 1
+            message.timeouts += 1
+            log.warning(
+                f"Refreshing active message {key} timed out after {message.timeout}s"
+            )
+        except Exception as e:
+            message.failures += 1
+            log.error(f"Failed to refresh active message {key}: {e}")
+
+        message.refreshes += 1
+        render_seconds = time.monotonic() - started - message.current_edit_seconds
+        message.last_render_seconds = render_seconds
+        message.max_render_seconds = max(message.max_render_seconds, render_seconds)
+
+    def _refresh_done(self, key, task):
+        self._running.pop(key, None)
+        self._wakeup.set()
+
+    def _start_refresh(self, key):
+        _, marked_at = self._dirty.pop(key)
+
+        # Any refresh counts towards the interval, so a message that refreshes on change
+        # only falls back to the periodic refresh when nothing changes
+        message = self._messages[key]
+        message.last_started = time.monotonic()
+        if message.interval:
+            message.next_due = message.last_started + message.interval
+
+        task = asyncio.get_running_loop().create_task(self._refresh(key, marked_at))
+        self._running[key] = task
+        task.add_done_callback(functools.partial(self._refresh_done, key))
+
+    async def _run(self):
+        while True:
+            self._log_stats_if_due()
+            self._mark_due()
+            is_full = len(self._running) >= self.max_concurrent
+            key = None if is_full else self._next_key()
+            if key is not None:
+                self._start_refresh(key)
+                continue
+
+            # With every slot taken, the next finished refresh wakes the loop up
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=None if is_full else self._next_wakeup_delay(),
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            if self.stats_log_interval:
+                self._next_stats_log = time.monotonic() + self.stats_log_interval
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for task in list(self._running.values()):
+            task.cancel()
+
+        log.info(f"Active message scheduler stopped: {self.stats()}")
+
+    def stats(self):
+        return {key: message.stats() for key, message in self._messages.items()}
+
+
+ACTIVE_MESSAGE_SCHEDULER = ActiveMessageScheduler()
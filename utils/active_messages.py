@@ -1,23 +1,26 @@
+import asyncio
+import collections
 import datetime
+import functools
+import hashlib
+import json
 import re
 import time
 
 import config
 import discord
 from discord import InteractionType
-from discord.ext import tasks
 from discord.ui import Button, View
-from utils.cache import ACTIVE_PLAYERS_BOHEMIA_ID_CACHE
+from utils.active_message_scheduler import ACTIVE_MESSAGE_SCHEDULER, PRIORITY_HIGH
+from utils.cache import ACTIVE_MESSAGES_REGISTRY, ACTIVE_PLAYERS_BOHEMIA_ID_CACHE
+from utils.system_monitors import SYSTEM_MONITOR
 from utils.utils import (
     add_mod_to_serverconfig,
     format_mos,
     format_time_elapsed,
-    get_active_messages_id,
     get_channel,
-    get_server_utilization,
     is_port_listening,
     remove_mod_from_serverconfig,
-    set_active_messages_id,
     update_mod_version_in_serverconfig,
 )
 from utils.website_scrapers import (
@@ -25,13 +28,184 @@ from utils.website_scrapers import (
     WorkshopModSearchWebsiteScraper,
 )
 
+# Numbers of the game servers; each has its own status message, mods channel and watchers
+SERVER_NUMBERS = tuple(getattr(config, "SERVER_NUMBERS", (1, 2, 3)))
 
-async def create_empty_message(channel, initial_message="Empty Message"):
-    message = await channel.send(initial_message)
-    return message
+# Server status messages refresh when the stats file changes, at most this often
+SERVER_STATUS_MIN_INTERVAL_SECONDS = getattr(
+    config, "SERVER_STATUS_MIN_INTERVAL_SECONDS", 5
+)
+
+# The server status and utilization messages also refresh periodically, between these
+# intervals depending on how busy the servers are
+STATUS_REFRESH_MIN_SECONDS = getattr(config, "STATUS_REFRESH_MIN_SECONDS", 15)
+STATUS_REFRESH_MAX_SECONDS = getattr(config, "STATUS_REFRESH_MAX_SECONDS", 300)
+# Gateway latency above which the periodic refreshes back off
+STATUS_REFRESH_SLOW_LATENCY_SECONDS = getattr(
+    config, "STATUS_REFRESH_SLOW_LATENCY_SECONDS", 1.0
+)
+
+# Show every game server as an embed of one combined status message instead of one each
+SERVER_STATUS_COMBINED = getattr(config, "SERVER_STATUS_COMBINED", False)
+
+# Discord's limits for the embeds of one message
+MESSAGE_MAX_EMBEDS = 10
+MESSAGE_MAX_EMBED_CHARACTERS = 6000
+
+# Name of the server status channel, showing the players of every server; None to leave it
+SERVER_STATUS_CHANNEL_NAME_FORMAT = getattr(
+    config, "SERVER_STATUS_CHANNEL_NAME_FORMAT", "⏳│𝐒𝐞𝐫𝐯𝐞𝐫-𝐒𝐭𝐚𝐭𝐮𝐬-〔{status}〕"
+)
+# Discord allows about 2 channel renames per 10 minutes
+CHANNEL_RENAMES_PER_WINDOW = getattr(config, "CHANNEL_RENAMES_PER_WINDOW", 2)
+CHANNEL_RENAME_WINDOW_SECONDS = getattr(config, "CHANNEL_RENAME_WINDOW_SECONDS", 600)
+
+# Keys of the active messages registered with ACTIVE_MESSAGE_SCHEDULER
+COMBINED_SERVER_STATUS_MESSAGE_KEY = "combined_server_status_message"
+TEAMS_MEMBERS_STATUS_MESSAGE_KEY = "teams_members_status_message"
+SERVER_UTILIZATION_STATUS_MESSAGE_KEY = "server_utilization_status_message"
+
+# An unchanged active message is still re-sent after this long, so its timestamp stays fresh
+ACTIVE_MESSAGE_MAX_STALENESS_SECONDS = getattr(
+    config, "ACTIVE_MESSAGE_MAX_STALENESS_SECONDS", 600
+)
+
+# Window of the min/avg/max shown on the server utilization message
+SERVER_UTILIZATION_WINDOW_MINUTES = getattr(
+    config, "SERVER_UTILIZATION_WINDOW_MINUTES", 15
+)
+# The latest sample is shown as stale once it is older than this many sampling intervals
+SERVER_UTILIZATION_STALE_INTERVALS = getattr(
+    config, "SERVER_UTILIZATION_STALE_INTERVALS", 3
+)
+
+# Embed fields with live process metrics; left out of the fingerprint like the timestamps, so
+# they alone never cause an edit and are brought up to date by the edits that happen anyway
+VOLATILE_EMBED_FIELDS = {"Process Details"}
+
+# message id -> (fingerprint, time.monotonic() of the last edit); dropped with the message
+ACTIVE_MESSAGE_FINGERPRINTS = {}
+
+
+def fingerprint_message(content=None, embeds=(), view=None):
+    """
+    Returns a hash of what a message renders to, ignoring the volatile embed timestamps and
+    VOLATILE_EMBED_FIELDS.
+    """
+    embed_dicts = []
+    for embed in embeds:
+        embed_dict = {
+            key: value for key, value in embed.to_dict().items() if key != "timestamp"
+        }
+        if "fields" in embed_dict:
+            embed_dict["fields"] = [
+                field
+                for field in embed_dict["fields"]
+                if field["name"] not in VOLATILE_EMBED_FIELDS
+            ]
+        embed_dicts.append(embed_dict)
+
+    payload = {
+        "content": content,
+        "embeds": embed_dicts,
+        "components": view.to_components() if view is not None else None,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+async def edit_active_message(message, embeds, view=None, content=None):
+    """
+    Edits an active message unless it would render exactly as the last edit did, in which case
+    the API call is skipped. A matching message is still edited once it is older than
+    ACTIVE_MESSAGE_MAX_STALENESS_SECONDS. The view is left as it is when not given.
+    Edits wait for a free slot in the channel's edit window of ACTIVE_MESSAGE_SCHEDULER.
+    Returns True if the message was edited.
+    """
+    fingerprint = fingerprint_message(content, embeds, view)
+    last_edit = ACTIVE_MESSAGE_FINGERPRINTS.get(message.id)
+    if (
+        last_edit
+        and last_edit[0] == fingerprint
+        and time.monotonic() - last_edit[1] < ACTIVE_MESSAGE_MAX_STALENESS_SECONDS
+    ):
+        ACTIVE_MESSAGE_SCHEDULER.record_skipped_edit()
+        return False
+
+    # Stay inside the channel's edit rate limit
+    await ACTIVE_MESSAGE_SCHEDULER.acquire_edit(message.channel.id)
+
+    started = time.perf_counter()
+    if view is not None:
+        await message.edit(content=content, embeds=embeds, view=view)
+    else:
+        await message.edit(content=content, embeds=embeds)
+    ACTIVE_MESSAGE_SCHEDULER.record_edit(time.perf_counter() - started)
+
+    ACTIVE_MESSAGE_FINGERPRINTS[message.id] = (fingerprint, time.monotonic())
+    return True
+
+
+def forget_active_message(message_entry):
+    """
+    Forgets the message of a registry entry together with its edit fingerprint.
+    """
+    message_id = ACTIVE_MESSAGES_REGISTRY.get_id(message_entry)
+    if message_id is not None:
+        ACTIVE_MESSAGE_FINGERPRINTS.pop(message_id, None)
+    ACTIVE_MESSAGES_REGISTRY.forget(message_entry)
+
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def format_bytes_per_second(value):
+    return f"{format_bytes(value)}/s"
+
+
+def format_bytes_per_second_band(value):
+    """
+    Rounds a rate up to the next power of 4 KB/s, e.g. "< 4.0 MB/s", so it rarely changes.
+    """
+    band = 1024
+    while band < value:
+        band *= 4
+    return f"< {format_bytes_per_second(band)}"
+
+
+async def resolve_members(guild, member_ids):
+    """
+    Returns {member_id: Member} for the given ids, read from the gateway member cache.
+    Ids missing from the cache are requested over the gateway with query_members in batches
+    of 100 (the API limit); members that left the guild are absent from the result.
+    """
+    members = {}
+    misses = []
+    for member_id in dict.fromkeys(member_ids):
+        member = guild.get_member(member_id)
+        if member:
+            members[member_id] = member
+        else:
+            misses.append(member_id)
+
+    for idx in range(0, len(misses), 100):
+        try:
+            for member in await guild.query_members(
+                user_ids=misses[idx : idx + 100], limit=100, cache=True
+            ):
+                members[member.id] = member
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            print(f"Failed to query {len(misses[idx : idx + 100])} members: {e}")
+
+    return members
 
 
-@tasks.loop(seconds=30)
 async def create_or_update_server_utilization_status_message(
     bot,
     channel_id,
@@ -46,22 +220,11 @@ async def create_or_update_server_utilization_status_message(
         print(f"Permission denied to access channel {channel_id}.")
         return False
 
-    # Fetch the message
-    message_id = None
-    message = None
+    # Get the message from the registry, creating it if needed
+    message_entry = "server_utilization_status_message_id"
     try:
-        message_id = get_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH, "server_utilization_status_message_id"
-        )
-        message = await channel.fetch_message(message_id)
-    except (FileNotFoundError, KeyError, discord.NotFound) as e:
-        message = await create_empty_message(
-            channel, "Creating a new message for team members status."
-        )
-        set_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH,
-            "server_utilization_status_message_id",
-            message.id,
+        message = await ACTIVE_MESSAGES_REGISTRY.get_message(
+            channel, message_entry, "Creating a new message for team members status."
         )
     except discord.Forbidden:
         print(
@@ -85,29 +248,87 @@ async def create_or_update_server_utilization_status_message(
         timestamp=datetime.datetime.now(),
     )
 
-    # Get CPU, memory, and disk usage
-    cpu, memory, disk = get_server_utilization()
-    if (
-        (isinstance(cpu, float) and cpu > 70)
-        or (isinstance(memory, float) and memory > 85)
-        or (isinstance(disk, float) and disk > 80)
-    ):
-        embed.color = discord.Color.red()
+    # Read the latest sample and the recent window from the background sampler
+    sample = SYSTEM_MONITOR.latest()
+    window = SYSTEM_MONITOR.window(SERVER_UTILIZATION_WINDOW_MINUTES * 60)
+    # The sampler thread may have stopped or fallen behind
+    stale = (
+        sample is not None
+        and time.time() - sample.timestamp
+        > SYSTEM_MONITOR.interval * SERVER_UTILIZATION_STALE_INTERVALS
+    )
+    if sample is None:
+        embed.description = "Collecting the first sample, check back in a few seconds."
+        embed.color = discord.Color.light_grey()
+    else:
+        if stale:
+            embed.description = f"⚠️ Stale data: the last sample was taken <t:{int(sample.timestamp)}:R>."
+            embed.color = discord.Color.light_grey()
+        elif sample.cpu > 70 or sample.memory > 85 or sample.disk > 80:
+            embed.color = discord.Color.red()
 
-    # Add fields to the embed
-    embed.add_field(name="CPU Usage", value=f"{cpu:.2f}%", inline=True)
-    embed.add_field(name="Memory Usage", value=f"{memory:.2f}%", inline=True)
-    embed.add_field(name="Disk Usage", value=f"{disk:.2f}%", inline=True)
+        # Add fields to the embed, each with its min / avg / max over the window
+        for name, field in (
+            ("CPU Usage", "cpu"),
+            ("Memory Usage", "memory"),
+            ("Disk Usage", "disk"),
+        ):
+            value = f"{getattr(sample, field):.2f}%"
+            # No sample falls in the window when the latest one is older than the window
+            if window is not None:
+                low, avg, high = window[field]
+                value += f"\n-# {low:.0f} / {avg:.0f} / {high:.0f}%"
+            embed.add_field(name=name, value=value, inline=True)
 
-    # Add footer with timestamp
-    embed.set_footer(text="Last updated")
+        embed.add_field(
+            name="Load Average",
+            value=f"{sample.load_1:.2f} / {sample.load_5:.2f} / {sample.load_15:.2f}",
+            inline=True,
+        )
+        embed.add_field(
+            name="Network",
+            value=(
+                f"⬆ {format_bytes_per_second(sample.net_sent_per_second)}\n"
+                f"⬇ {format_bytes_per_second(sample.net_recv_per_second)}"
+            ),
+            inline=True,
+        )
+
+        # Resource usage of each game server process
+        server_lines = []
+        for server_number in SYSTEM_MONITOR.server_processes:
+            process = SYSTEM_MONITOR.server_process(server_number)
+            if process is None:
+                server_lines.append(f"Server {server_number}: not running")
+            else:
+                server_lines.append(
+                    f"Server {server_number}: {process.cpu:.1f}% CPU • {format_bytes(process.rss)}"
+                )
+        if server_lines:
+            embed.add_field(
+                name="Game Servers", value="\n".join(server_lines), inline=False
+            )
+
+    # Refresh as often as the busiest server (or the host) needs
+    activity = max(SERVER_ACTIVITY.values(), default=0.0)
+    if sample is not None and not stale:
+        activity = max(activity, min(sample.cpu / 70, 1.0))
+    interval = adaptive_refresh_interval(activity, bot.latency)
+    ACTIVE_MESSAGE_SCHEDULER.set_interval(interval)
+
+    # Add footer with the window, refresh interval and timestamp
+    embed.set_footer(
+        text=f"Min / avg / max over {SERVER_UTILIZATION_WINDOW_MINUTES} min • Refreshing every {interval}s • Last updated"
+    )
 
     # Edit the message with the new content
     try:
-        await message.edit(content=None, embed=embed, view=view)
+        await edit_active_message(message, [embed], view)
     except discord.NotFound:
-        time.sleep(config.SLEEP_TIME)
-        create_or_update_server_utilization_status_message(bot, channel_id)
+        # The message was deleted; forget it so the next call creates a new one
+        forget_active_message(message_entry)
+        await asyncio.sleep(config.SLEEP_TIME)
+        return await create_or_update_server_utilization_status_message(bot, channel_id)
     except discord.Forbidden:
         print(
             f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
@@ -132,20 +353,11 @@ async def create_or_update_teams_members_status_message(
         print(f"Permission denied to access channel {channel_id}.")
         return False
 
-    # Fetch the message
-    message_id = None
-    message = None
+    # Get the message from the registry, creating it if needed
+    message_entry = "teams_members_status_message_id"
     try:
-        message_id = get_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH, "teams_members_status_message_id"
-        )
-        message = await channel.fetch_message(message_id)
-    except (FileNotFoundError, KeyError, discord.NotFound) as e:
-        message = await create_empty_message(
-            channel, "Creating a new message for team members status."
-        )
-        set_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH, "teams_members_status_message_id", message.id
+        message = await ACTIVE_MESSAGES_REGISTRY.get_message(
+            channel, message_entry, "Creating a new message for team members status."
         )
     except discord.Forbidden:
         print(
@@ -165,22 +377,26 @@ async def create_or_update_teams_members_status_message(
     view = View(timeout=None)
     view.add_item(refresh_button)
 
-    # Get data from database
-    users = user_dbm.get_users_for_active_message()
+    # Get the active members of each team from the roster table
+    teams = await user_dbm.aio.get_team_rosters(config.TEAMS)
 
-    # Group users by team
-    teams = {team: [] for team in config.TEAMS}
-    for user_id, user_status, user_team, user_joined in users:
-        if user_status == "Active" and user_team in config.TEAMS:
-            teams[user_team].append((user_id, user_joined))
+    # Skip Unassigned, Green Team and Red Talon
+    teams = {
+        team_name: members
+        for team_name, members in teams.items()
+        if team_name not in ["Unassigned", "Green Team", "Red Talon"]
+    }
+
+    # Resolve every listed member from the gateway cache in one go
+    guild_members = await resolve_members(
+        bot.guilds[0],
+        [member_id for members in teams.values() for member_id, _ in members],
+    )
 
     # Add each team as a field in the embed
     embed_list = []
     for team_name, members in teams.items():
 
-        if team_name in ["Unassigned", "Green Team", "Red Talon"]:
-            continue  # Skip Unassigned and Green Team
-
         # Create Discord embed for better formatting
         embed_title = team_name
         embed_color = discord.Color(0xFFFFFE)
@@ -199,10 +415,10 @@ async def create_or_update_teams_members_status_message(
         joined_list = ""
         for idx, (member_id, joined) in enumerate(members):
             user = bot.get_user(member_id)
-            member = await bot.guilds[0].fetch_member(member_id)
+            member = guild_members.get(member_id)
 
-            display_name = user.display_name
-            user_roles = member.roles
+            display_name = user.display_name if user else str(member_id)
+            user_roles = member.roles if member else []
 
             if len(display_name) > 23:
                 name_list += f"{idx + 1}- {display_name[:23]}...\n"
@@ -241,10 +457,14 @@ async def create_or_update_teams_members_status_message(
 
     # Edit the message with the new content
     try:
-        await message.edit(content=None, embeds=embed_list, view=view)
+        await edit_active_message(message, embed_list, view)
     except discord.NotFound:
-        time.sleep(config.SLEEP_TIME)
-        create_or_update_teams_members_status_message(bot, channel_id, user_dbm)
+        # The message was deleted; forget it so the next call creates a new one
+        forget_active_message(message_entry)
+        await asyncio.sleep(config.SLEEP_TIME)
+        return await create_or_update_teams_members_status_message(
+            bot, channel_id, user_dbm
+        )
     except discord.Forbidden:
         print(
             f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
@@ -254,66 +474,131 @@ async def create_or_update_teams_members_status_message(
     return True
 
 
-@tasks.loop(seconds=30)
-async def create_or_update_active_players_on_arma_reforger_server_status_message(
-    entries,
-):
-    await create_or_update_active_players_on_arma_reforger_server_status_message_util(
-        *entries[0]
+class ChannelNameUpdater:
+    """
+    Renames channels within Discord's channel edit limit (about 2 per 10 minutes).
+
+    Each channel has its own budget of renames_per_window renames per window_seconds. A rename is
+    only sent when the requested name differs from the last one sent to that channel (not from
+    channel.name, which Discord normalizes, e.g. to lowercase); while the budget is used up,
+    newer requests replace the waiting one, so the newest name goes out as soon as the budget
+    frees up.
+    """
+
+    def __init__(
+        self,
+        renames_per_window=CHANNEL_RENAMES_PER_WINDOW,
+        window_seconds=CHANNEL_RENAME_WINDOW_SECONDS,
+    ):
+        self.renames_per_window = renames_per_window
+        self.window_seconds = window_seconds
+
+        # channel_id -> time.monotonic() of the recent renames of that channel
+        self._renames = collections.defaultdict(collections.deque)
+        # channel_id -> (channel, name) waiting to be sent
+        self._pending = {}
+        # channel_id -> task sending the pending name
+        self._tasks = {}
+        # channel_id -> last name sent successfully
+        self._sent_names = {}
+
+    def _rename_delay(self, channel_id):
+        renames = self._renames[channel_id]
+        now = time.monotonic()
+        while renames and now - renames[0] >= self.window_seconds:
+            renames.popleft()
+
+        if len(renames) < self.renames_per_window:
+            return 0.0
+
+        return renames[0] + self.window_seconds - now
+
+    def request(self, channel, name):
+        if self._sent_names.get(channel.id) == name:
+            self._pending.pop(channel.id, None)
+            return
+
+        self._pending[channel.id] = (channel, name)
+        if channel.id not in self._tasks:
+            self._tasks[channel.id] = asyncio.get_running_loop().create_task(
+                self._send(channel.id)
+            )
+
+    async def _send(self, channel_id):
+        try:
+            while channel_id in self._pending:
+                delay = self._rename_delay(channel_id)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                channel, name = self._pending.pop(channel_id)
+                if self._sent_names.get(channel_id) == name:
+                    continue
+
+                self._renames[channel_id].append(time.monotonic())
+                try:
+                    await channel.edit(name=name)
+                    self._sent_names[channel_id] = name
+                except discord.Forbidden:
+                    print(f"Permission denied to rename channel {channel_id}.")
+                except discord.HTTPException as e:
+                    print(f"Failed to rename channel {channel_id}: {e}")
+        finally:
+            self._tasks.pop(channel_id, None)
+
+
+CHANNEL_NAME_UPDATER = ChannelNameUpdater()
+
+# server number -> players shown for it in the server status channel name
+SERVER_STATUS_CHANNEL_VALUES = {}
+
+
+# server number -> how busy the server is, from 0 (offline or idle) to 1 (players online)
+SERVER_ACTIVITY = {}
+
+
+def adaptive_refresh_interval(activity, latency=None):
+    """
+    Maps activity (0 idle to 1 busy) linearly onto a refresh interval from
+    STATUS_REFRESH_MAX_SECONDS down to STATUS_REFRESH_MIN_SECONDS. A slow or unknown gateway
+    latency doubles the interval, up to the maximum.
+    """
+    interval = STATUS_REFRESH_MAX_SECONDS - activity * (
+        STATUS_REFRESH_MAX_SECONDS - STATUS_REFRESH_MIN_SECONDS
     )
-    await create_or_update_active_players_on_arma_reforger_server_status_message_util(
-        *entries[1]
+    if latency is not None and not latency < STATUS_REFRESH_SLOW_LATENCY_SECONDS:
+        interval = min(interval * 2, STATUS_REFRESH_MAX_SECONDS)
+
+    return round(interval)
+
+
+def update_server_status_channel_name(channel):
+    """
+    Asks CHANNEL_NAME_UPDATER to show the player count of every server in the channel name.
+    """
+    # Wait until every server was rendered once, so no rename is spent on a partial name
+    if not SERVER_STATUS_CHANNEL_NAME_FORMAT or any(
+        server_number not in SERVER_STATUS_CHANNEL_VALUES
+        for server_number in SERVER_NUMBERS
+    ):
+        return
+
+    status = "・".join(
+        SERVER_STATUS_CHANNEL_VALUES[server_number] for server_number in SERVER_NUMBERS
     )
-    await create_or_update_active_players_on_arma_reforger_server_status_message_util(
-        *entries[2]
+    CHANNEL_NAME_UPDATER.request(
+        channel, SERVER_STATUS_CHANNEL_NAME_FORMAT.format(status=status)
     )
 
 
-async def create_or_update_active_players_on_arma_reforger_server_status_message_util(
-    bot,
-    channel_id,
-    server_number,
-    server_stats,
-    server_config,
-    users_dbm,
+async def make_server_status_embed(
+    server_number, server_stats, server_config, users_dbm
 ):
-    # Fetch the channel
-    try:
-        channel = bot.get_channel(channel_id)
-    except discord.NotFound:
-        print(f"Channel with ID {channel_id} not found.")
-        return False
-    except discord.Forbidden:
-        print(f"Permission denied to access channel {channel_id}.")
-        return False
-
-    # Fetch the message
-    message_id = None
-    message = None
-    try:
-        message_id = get_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH,
-            f"active_players_on_arma_reforger_server_status_message_id_{server_number}",
-        )
-        message = await channel.fetch_message(message_id)
-    except (FileNotFoundError, KeyError, discord.NotFound) as e:
-        message = await create_empty_message(
-            channel, "Creating a new message for active players status."
-        )
-        set_active_messages_id(
-            config.ACTIVEMESSAGESIDS_PATH,
-            f"active_players_on_arma_reforger_server_status_message_id_{server_number}",
-            message.id,
-        )
-    except discord.Forbidden:
-        print(
-            f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
-        )
-        return False
-    except Exception as e:
-        print(f"Unknown Exception: {e}")
-        return False
-
+    """
+    Renders the status embed of a game server (without footer), records its activity in
+    SERVER_ACTIVITY and updates the last seen of its known players.
+    """
     # Create Discord embed for better formatting
     embed = discord.Embed(
         title=f"Server {server_number}: Online",
@@ -324,14 +609,30 @@ async def create_or_update_active_players_on_arma_reforger_server_status_message
     # Get gameserver online status
     gameserver_status = is_port_listening(server_config.bindPort)
 
+    # Players online make the server busy; a running server that keeps writing its stats
+    # file counts a little, an idle or offline one not at all
     if not gameserver_status:
-        # await channel.edit(name=f"⏳│𝐒𝐞𝐫𝐯𝐞𝐫-𝐒𝐭𝐚𝐭𝐮𝐬-〔Offline〕")
+        SERVER_ACTIVITY[server_number] = 0.0
+    elif server_stats.players > 0:
+        SERVER_ACTIVITY[server_number] = 1.0
+    elif (
+        server_stats.last_modified is not None
+        and time.monotonic() - server_stats.last_modified < STATUS_REFRESH_MAX_SECONDS
+    ):
+        SERVER_ACTIVITY[server_number] = 0.25
+    else:
+        SERVER_ACTIVITY[server_number] = 0.0
+
+    if not gameserver_status:
+        SERVER_STATUS_CHANNEL_VALUES[server_number] = "Offline"
         embed.title = f"Server {server_number}: Offline"
         embed.color = discord.Color.red()
     else:
-        # await channel.edit(
-        #     name=f"⏳│𝐒𝐞𝐫𝐯𝐞𝐫-𝐒𝐭𝐚𝐭𝐮𝐬-〔{server_stats.players}／{server_config.game.maxPlayers}〕"
-        # )
+        SERVER_STATUS_CHANNEL_VALUES[server_number] = (
+            f"{server_stats.players}／{server_config.game.maxPlayers}"
+            if server_stats.players != -1
+            else "?"
+        )
 
         # Define the field to be added
 
@@ -362,11 +663,16 @@ async def create_or_update_active_players_on_arma_reforger_server_status_message
                     player_bohemia_id, player_name
                 )
 
-                if ACTIVE_PLAYERS_BOHEMIA_ID_CACHE.is_known_player(player_bohemia_id):
-                    player_discord_id = users_dbm.read_by_bohemia_id(player_bohemia_id)[
-                        0
-                    ]
-                    users_dbm.reset_joined(player_discord_id)
+            # Update last seen of known players in one batch
+            await users_dbm.aio.touch_last_seen(
+                [
+                    player_bohemia_id
+                    for player_bohemia_id in server_stats.connected_players
+                    if ACTIVE_PLAYERS_BOHEMIA_ID_CACHE.is_known_player(
+                        player_bohemia_id
+                    )
+                ]
+            )
 
         embed.add_field(**field)
 
@@ -383,6 +689,21 @@ async def create_or_update_active_players_on_arma_reforger_server_status_message
             inline=False,
         )
 
+        # Process details field, coarsely rounded; the live values are on the utilization message
+        process = SYSTEM_MONITOR.server_process(server_number)
+        if process is not None:
+            embed.add_field(
+                name="Process Details",
+                value=(
+                    f"⠀**CPU:** {process.cpu:.0f}%\n"
+                    f"⠀**Memory:** {format_bytes(round(process.rss / 2**26) * 2**26)}\n"
+                    f"⠀**Threads:** {process.threads}\n"
+                    f"⠀**Disk I/O:** {format_bytes_per_second_band(process.read_per_second)} read, "
+                    f"{format_bytes_per_second_band(process.write_per_second)} write\n"
+                ),
+                inline=False,
+            )
+
         # Server details field
         embed.add_field(
             name="Server Details",
@@ -395,12 +716,66 @@ async def create_or_update_active_players_on_arma_reforger_server_status_message
             inline=False,
         )
 
-    # Add footer with timestamp
-    embed.set_footer(text="Last updated")
+    return embed
+
+
+async def create_or_update_active_players_on_arma_reforger_server_status_message_util(
+    bot,
+    channel_id,
+    server_number,
+    server_stats,
+    server_config,
+    users_dbm,
+):
+    # Fetch the channel
+    try:
+        channel = bot.get_channel(channel_id)
+    except discord.NotFound:
+        print(f"Channel with ID {channel_id} not found.")
+        return False
+    except discord.Forbidden:
+        print(f"Permission denied to access channel {channel_id}.")
+        return False
+
+    # Get the message from the registry, creating it if needed
+    message_entry = (
+        f"active_players_on_arma_reforger_server_status_message_id_{server_number}"
+    )
+    try:
+        message = await ACTIVE_MESSAGES_REGISTRY.get_message(
+            channel, message_entry, "Creating a new message for active players status."
+        )
+        # Delete the combined message left over from before switching to one per server
+        await delete_combined_server_status_messages(channel)
+    except discord.Forbidden:
+        print(
+            f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
+        )
+        return False
+    except Exception as e:
+        print(f"Unknown Exception: {e}")
+        return False
+
+    # Render the embed
+    embed = await make_server_status_embed(
+        server_number, server_stats, server_config, users_dbm
+    )
+    update_server_status_channel_name(channel)
+
+    # Refresh as often as the server's activity needs
+    interval = adaptive_refresh_interval(SERVER_ACTIVITY[server_number], bot.latency)
+    ACTIVE_MESSAGE_SCHEDULER.set_interval(interval)
+
+    # Add footer with the refresh interval and timestamp
+    embed.set_footer(text=f"Refreshing every {interval}s • Last updated")
 
     # Edit the message with the new content
     try:
-        await message.edit(content=None, embed=embed)
+        await edit_active_message(message, [embed])
+    except discord.NotFound:
+        # The message was deleted; forget it so the next refresh creates a new one
+        forget_active_message(message_entry)
+        return False
     except discord.Forbidden:
         print(
             f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
@@ -413,6 +788,144 @@ async def create_or_update_active_players_on_arma_reforger_server_status_message
     return True
 
 
+async def delete_active_message(channel, message_entry):
+    """
+    Deletes the message of message_entry from channel, if there is one, and forgets it.
+    """
+    message_id = ACTIVE_MESSAGES_REGISTRY.get_id(message_entry)
+    if message_id is None:
+        return
+
+    try:
+        await channel.get_partial_message(message_id).delete()
+    except discord.NotFound:
+        pass
+
+    forget_active_message(message_entry)
+
+
+async def delete_combined_server_status_messages(channel, first_page=0):
+    """
+    Deletes the combined server status messages from page first_page on.
+    """
+    page_number = first_page
+    while (
+        ACTIVE_MESSAGES_REGISTRY.get_id(
+            f"combined_server_status_message_id_{page_number}"
+        )
+        is not None
+    ):
+        await delete_active_message(
+            channel, f"combined_server_status_message_id_{page_number}"
+        )
+        page_number += 1
+
+
+def pack_embeds(embeds):
+    """
+    Splits embeds, in order, into as few messages as Discord's per message limits allow
+    (MESSAGE_MAX_EMBEDS embeds and MESSAGE_MAX_EMBED_CHARACTERS characters across them).
+    """
+    pages = [[]]
+    page_size = 0
+    for embed in embeds:
+        if pages[-1] and (
+            len(pages[-1]) >= MESSAGE_MAX_EMBEDS
+            or page_size + len(embed) > MESSAGE_MAX_EMBED_CHARACTERS
+        ):
+            pages.append([])
+            page_size = 0
+
+        pages[-1].append(embed)
+        page_size += len(embed)
+
+    return pages
+
+
+async def create_or_update_combined_server_status_message(
+    bot,
+    channel_id,
+    servers,
+    users_dbm,
+):
+    """
+    Shows every game server as an embed of one message, updated with a single edit.
+    servers is a list of (server_number, server_stats, server_config). Only when the embeds
+    exceed the limits of one message are they split over several, and messages left over
+    from an earlier split, or from one message per server, are deleted.
+    """
+    # Fetch the channel
+    try:
+        channel = bot.get_channel(channel_id)
+    except discord.NotFound:
+        print(f"Channel with ID {channel_id} not found.")
+        return False
+    except discord.Forbidden:
+        print(f"Permission denied to access channel {channel_id}.")
+        return False
+
+    # Render the embeds of every server at once
+    embeds = await asyncio.gather(
+        *(
+            make_server_status_embed(
+                server_number, server_stats, server_config, users_dbm
+            )
+            for server_number, server_stats, server_config in servers
+        )
+    )
+    update_server_status_channel_name(channel)
+
+    # Refresh as often as the busiest server needs
+    interval = adaptive_refresh_interval(
+        max(
+            SERVER_ACTIVITY[server_number]
+            for server_number, server_stats, server_config in servers
+        ),
+        bot.latency,
+    )
+    ACTIVE_MESSAGE_SCHEDULER.set_interval(interval)
+
+    # Add footer with the refresh interval and timestamp
+    for embed in embeds:
+        embed.set_footer(text=f"Refreshing every {interval}s • Last updated")
+    pages = pack_embeds(embeds)
+
+    # Edit the messages with the new content, one edit per message
+    for page_number, page in enumerate(pages):
+        message_entry = f"combined_server_status_message_id_{page_number}"
+        try:
+            message = await ACTIVE_MESSAGES_REGISTRY.get_message(
+                channel, message_entry, "Creating a new message for server status."
+            )
+            await edit_active_message(message, page)
+        except discord.NotFound:
+            # The message was deleted; forget it so the next refresh creates a new one
+            forget_active_message(message_entry)
+            return False
+        except discord.Forbidden:
+            print(
+                f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
+            )
+            return False
+
+    # Delete the messages of pages that are no longer needed, and the per-server messages
+    # left over from before switching to the combined message
+    try:
+        await delete_combined_server_status_messages(channel, len(pages))
+        for server_number, server_stats, server_config in servers:
+            await delete_active_message(
+                channel,
+                f"active_players_on_arma_reforger_server_status_message_id_{server_number}",
+            )
+    except discord.Forbidden:
+        print(
+            f"Permission denied. Contact the server administrator to check permissions for channel {channel_id}."
+        )
+        return False
+
+    return True
+
+
 class ModsActiveMessages:
     def __init__(self, bot, channel_id, server_config, server_config_path):
         self.bot = bot
@@ -423,6 +936,8 @@ class ModsActiveMessages:
         self.channel = None
         self.messages_cache = {}
         self.mod_idx = -1  # Used to track the index of the mod being processed
+        # Scheduler keys of the mod messages refreshed on request
+        self.scheduled_keys = set()
 
     def make_mod_message(self, mod_id):
         # Get mod details
@@ -563,12 +1078,15 @@ class ModsActiveMessages:
 
         try:
             message = self.messages_cache[message_key]
-            await message.edit(content=None, embed=embed, view=view)
+            await edit_active_message(message, [embed], view)
         except (KeyError, discord.NotFound) as e:
+            if message_key in self.messages_cache:
+                ACTIVE_MESSAGE_FINGERPRINTS.pop(
+                    self.messages_cache[message_key].id, None
+                )
             message = await self.channel.send(embed=embed, view=view)
             self.messages_cache[message_key] = message
 
-    @tasks.loop(minutes=1)
     async def create_or_update_mod_messages(self):
         if self.mod_idx == -1:
             # Clear all previous messages
@@ -586,6 +1104,24 @@ class ModsActiveMessages:
         mod_id = mod["modId"]
         await self.create_or_update_mod_message(mod_id)
 
+    def mod_message_scheduler_key(self, mod_id):
+        return "mod_{}_status_message_{}".format(mod_id, self.channel_id)
+
+    def mark_mod_message_dirty(self, mod_id):
+        """
+        Asks ACTIVE_MESSAGE_SCHEDULER to refresh the message of a mod ahead of the rotation.
+        """
+        key = self.mod_message_scheduler_key(mod_id)
+        if key not in self.scheduled_keys:
+            ACTIVE_MESSAGE_SCHEDULER.register(
+                key,
+                functools.partial(self.create_or_update_mod_message, mod_id),
+                self.channel_id,
+            )
+            self.scheduled_keys.add(key)
+
+        ACTIVE_MESSAGE_SCHEDULER.mark_dirty(key, PRIORITY_HIGH)
+
     async def create_mod_search_message(self, search_query):
         if not self.channel:
             self.channel = get_channel(self.bot, self.channel_id)
@@ -621,7 +1157,7 @@ class ModsActiveMessages:
                     )
 
                     await interaction.message.delete()
-                    await self.create_or_update_mod_message(mod_id)
+                    self.mark_mod_message_dirty(mod_id)
 
                 elif message_type == "update_mod":
                     new_version = custom_id[2]
@@ -629,14 +1165,19 @@ class ModsActiveMessages:
                         self.server_config_path, mod_id, new_version
                     )
 
-                    await self.create_or_update_mod_message(mod_id)
+                    self.mark_mod_message_dirty(mod_id)
 
                 elif message_type == "check_mod":
-                    await self.create_or_update_mod_message(mod_id)
+                    self.mark_mod_message_dirty(mod_id)
 
                 elif message_type == "remove_mod":
                     remove_mod_from_serverconfig(self.server_config_path, mod_id)
 
+                    # Drop a pending refresh so it does not bring the message back
+                    key = self.mod_message_scheduler_key(mod_id)
+                    if key in self.scheduled_keys:
+                        ACTIVE_MESSAGE_SCHEDULER.unregister(key)
+                        self.scheduled_keys.discard(key)
                     await self.delete_mod_message(mod_id)
 
                 else:
@@ -652,6 +1193,7 @@ class ModsActiveMessages:
         if message_key in self.messages_cache:
             message = self.messages_cache[message_key]
             self.messages_cache.pop(message_key)
+            ACTIVE_MESSAGE_FINGERPRINTS.pop(message.id, None)
             await message.delete()
 
     async def clear(self):
@@ -659,4 +1201,6 @@ class ModsActiveMessages:
             self.channel = get_channel(self.bot, self.channel_id)
 
         await self.channel.purge(limit=None)
+        for message in self.messages_cache.values():
+            ACTIVE_MESSAGE_FINGERPRINTS.pop(message.id, None)
         self.messages_cache.clear()
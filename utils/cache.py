@@ -1,4 +1,19 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import config
+
 from utils.database_managers import USERS_DBM
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+# Changes to the active message ids are written at most this often
+ACTIVE_MESSAGES_SAVE_DELAY_SECONDS = getattr(
+    config, "ACTIVE_MESSAGES_SAVE_DELAY_SECONDS", 5
+)
 
 
 class ActivePlayersBohemiaIDCache:
@@ -47,3 +62,92 @@ class ActivePlayersBohemiaIDCache:
 
 
 ACTIVE_PLAYERS_BOHEMIA_ID_CACHE = ActivePlayersBohemiaIDCache(USERS_DBM)
+
+
+class ActiveMessageRegistry:
+    """
+    In-memory registry of the active messages, backed by the JSON file of message ids.
+
+    The file is read once; afterwards get_message serves the cached Message, or a
+    PartialMessage built from the stored id, without any HTTP request. A message is only
+    created when its entry has no id (or was forgotten after a NotFound). Changes are written
+    back after a short delay, to a temporary file that then replaces the real one.
+    """
+
+    def __init__(self, path, save_delay=ACTIVE_MESSAGES_SAVE_DELAY_SECONDS):
+        self.path = Path(path)
+        self.save_delay = save_delay
+
+        self._ids = self._load()
+        self._messages = {}
+        self._save_handle = None
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            log.error(f"Failed to read active message ids from {self.path}: {e}")
+            return {}
+
+    def get_id(self, entry):
+        return self._ids.get(entry)
+
+    async def get_message(self, channel, entry, initial_message="Empty Message"):
+        """
+        Returns the message of entry in channel, sending initial_message to create it if needed.
+        """
+        message = self._messages.get(entry)
+        if message is not None and message.channel.id == channel.id:
+            return message
+
+        message_id = self._ids.get(entry)
+        if message_id is not None:
+            message = channel.get_partial_message(message_id)
+        else:
+            message = await channel.send(initial_message)
+            self._ids[entry] = message.id
+            self._schedule_save()
+
+        self._messages[entry] = message
+        return message
+
+    def forget(self, entry):
+        """
+        Drops entry, e.g. after its message was deleted; the next get_message creates a new one.
+        """
+        self._messages.pop(entry, None)
+        if self._ids.pop(entry, None) is not None:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        if self._save_handle is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+
+        self._save_handle = loop.call_later(self.save_delay, self.save)
+
+    def save(self):
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(self._ids, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            log.error(f"Failed to save active message ids to {self.path}: {e}")
+
+
+ACTIVE_MESSAGES_REGISTRY = ActiveMessageRegistry(config.ACTIVEMESSAGESIDS_PATH)
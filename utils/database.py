@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+
+class Database:
+    """
+    Long-lived SQLite connection shared by every database manager that points at the same file.
+
+    The connection is opened once and guarded by a re-entrant lock, so it can be used from the
+    event loop thread as well as from the dedicated database thread. Awaitable access goes through
+    a single-worker executor: queries run one after another on that thread and the event loop is
+    free to keep the gateway heartbeat going while SQLite does its work.
+
+    Attributes:
+        db_file (str): Path to the SQLite database file.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self._after_commit = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="talon-db"
+        )
+        self._conn = self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=10)
+
+        # Only takes effect on a new file; migrate() converts existing ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+        # WAL lets the status loops keep reading while role changes are written, and with WAL
+        # synchronous=NORMAL only syncs on checkpoints instead of on every commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        return conn
+
+    @contextmanager
+    def cursor(self):
+        """
+        Yields a cursor on the shared connection and commits when the block exits cleanly.
+        Any exception rolls the statement back before being re-raised.
+        Inside transaction() nothing is committed until the outermost transaction ends.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+                if not self._transaction_depth:
+                    self._conn.commit()
+            except Exception:
+                if not self._transaction_depth:
+                    self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups every statement run in the block into one transaction with a single commit.
+
+        Transactions nest; only the outermost one commits, and an exception anywhere rolls the
+        whole unit back. The connection stays locked to the calling thread for the duration.
+        """
+        with self._lock:
+            if not self._transaction_depth:
+                self._conn.execute("BEGIN")
+            self._transaction_depth += 1
+
+            try:
+                yield
+            except BaseException:
+                self._transaction_depth -= 1
+                if not self._transaction_depth:
+                    self._conn.rollback()
+                    self._after_commit.clear()
+                raise
+
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self._conn.commit()
+                callbacks, self._after_commit = self._after_commit, []
+                for callback in callbacks:
+                    callback()
+
+    def after_commit(self, callback):
+        """
+        Runs callback once the current changes are committed: right away outside a
+        transaction, otherwise when the outermost transaction commits (never on rollback).
+        Used to keep in-memory caches in step with the database.
+        """
+        with self._lock:
+            if self._transaction_depth:
+                self._after_commit.append(callback)
+                return
+
+        callback()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking callable on the database thread and returns its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def attach(self, db_file, schema):
+        """
+        Attaches another database file to the shared connection under the given schema name.
+        Does nothing if the schema is already attached.
+        """
+        with self._lock:
+            if self.is_attached(schema):
+                return
+
+            self._conn.execute("ATTACH DATABASE ? AS " + schema, (db_file,))
+            self._conn.execute(f"PRAGMA {schema}.auto_vacuum=INCREMENTAL")
+            self._conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+            self._conn.execute(f"PRAGMA {schema}.synchronous=NORMAL")
+
+    def is_attached(self, schema):
+        with self._lock:
+            return any(
+                row[1] == schema
+                for row in self._conn.execute("PRAGMA database_list").fetchall()
+            )
+
+    def incremental_vacuum(self, schema="main"):
+        """
+        Returns the free pages of an auto_vacuum=INCREMENTAL database to the file system.
+        Returns the number of pages freed.
+        """
+        with self._lock:
+            freelist_count = self._conn.execute(
+                f"PRAGMA {schema}.freelist_count"
+            ).fetchone()[0]
+            self._conn.execute(f"PRAGMA {schema}.incremental_vacuum").fetchall()
+            return freelist_count
+
+    def checkpoint(self, mode="PASSIVE"):
+        """
+        Copies WAL frames back into the database file.
+        Returns (busy, wal_frames, checkpointed_frames) as reported by SQLite.
+        """
+        with self._lock:
+            return self._conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+    def backup(self, backup_file, pages=64, sleep=0.05, source_file=None):
+        """
+        Takes an online backup of the database (or of source_file, e.g. an attached
+        archive) into backup_file.
+
+        Uses its own read connection and copies a few pages per step, sleeping in between,
+        so the shared connection is never held and writers are not locked out.
+        """
+        source = sqlite3.connect(source_file or self.db_file, timeout=10)
+        target = sqlite3.connect(backup_file)
+        try:
+            source.backup(target, pages=pages, sleep=sleep)
+        finally:
+            target.close()
+            source.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            # Refresh query planner statistics for the indexes that saw use this session
+            self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+        log.info(f"Closed database {self.db_file}")
+
+
+class AsyncDatabaseManager:
+    """
+    Awaitable facade over a database manager.
+
+    Exposes the same method names as the wrapped manager; every call is dispatched to the
+    manager's database thread, e.g. ``await USERS_DBM.aio.update_team(user.id, team)``.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+
+    def __getattr__(self, name):
+        attr = getattr(self._manager, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self._manager.db.run(attr, *args, **kwargs)
+
+        return wrapper
+
+
+_DATABASES = {}
+_DATABASES_LOCK = threading.Lock()
+
+
+def get_database(db_file):
+    """
+    Returns the shared Database for the given file, opening it on first use.
+    """
+    with _DATABASES_LOCK:
+        if db_file not in _DATABASES:
+            _DATABASES[db_file] = Database(db_file)
+
+        return _DATABASES[db_file]
+
+
+def close_databases():
+    """
+    Closes every shared Database. Meant to be called once on shutdown.
+    """
+    with _DATABASES_LOCK:
+        for database in _DATABASES.values():
+            database.close()
+        _DATABASES.clear()
@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+from pathlib import Path
+
+import config
+from discord.ext import tasks
+
+from utils.database_migrations import ARCHIVE_SCHEMA, get_archive_path
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+DB_CHECKPOINT_INTERVAL_MINUTES = getattr(config, "DB_CHECKPOINT_INTERVAL_MINUTES", 5)
+DB_BACKUP_INTERVAL_HOURS = getattr(config, "DB_BACKUP_INTERVAL_HOURS", 6)
+DB_BACKUP_DIR_PATH = getattr(
+    config,
+    "DB_BACKUP_DIR_PATH",
+    str(Path(config.USER_DB_PATH).resolve().parent / "backups"),
+)
+DB_BACKUP_KEEP = getattr(config, "DB_BACKUP_KEEP", 8)
+DB_BACKUP_PAGES_PER_STEP = getattr(config, "DB_BACKUP_PAGES_PER_STEP", 64)
+AUDIT_LOG_RETENTION_DAYS = getattr(config, "AUDIT_LOG_RETENTION_DAYS", 365)
+DB_ARCHIVE_INTERVAL_HOURS = getattr(config, "DB_ARCHIVE_INTERVAL_HOURS", 24)
+DB_ARCHIVE_BATCH_SIZE = getattr(config, "DB_ARCHIVE_BATCH_SIZE", 1000)
+
+
+class DatabaseMaintenance:
+    """
+    Background upkeep for a shared Database.
+
+    Every tick the WAL is checkpointed passively (never waits on readers or writers). Once the
+    last backup is older than the backup interval, an online backup is taken in small page
+    steps on a worker thread and old backups beyond the retention count are removed.
+
+    Once per archive interval, log rows older than the retention age are moved in batches from
+    the managers in archive_managers to the attached archive database, the freed pages are
+    returned with an incremental vacuum and the archive is backed up.
+    """
+
+    def __init__(
+        self,
+        db,
+        archive_managers=(),
+        backup_dir_path=DB_BACKUP_DIR_PATH,
+        backup_interval_hours=DB_BACKUP_INTERVAL_HOURS,
+        backup_keep=DB_BACKUP_KEEP,
+        retention_days=AUDIT_LOG_RETENTION_DAYS,
+        archive_interval_hours=DB_ARCHIVE_INTERVAL_HOURS,
+    ):
+        self.db = db
+        self.archive_managers = archive_managers
+        self.backup_dir = Path(backup_dir_path)
+        self.backup_interval = datetime.timedelta(hours=backup_interval_hours)
+        self.backup_keep = backup_keep
+        self.retention = datetime.timedelta(days=retention_days)
+        self.archive_interval = datetime.timedelta(hours=archive_interval_hours)
+
+        self.last_backup_at = self._find_last_backup_time()
+        self.last_archive_at = None
+
+        self.run.change_interval(minutes=DB_CHECKPOINT_INTERVAL_MINUTES)
+
+    def _backup_files(self, db_file):
+        # Timestamped names only, so users_archive_* is not taken for a backup of users
+        stem = Path(db_file).stem
+        return sorted(self.backup_dir.glob(f"{stem}_[0-9]*.db"))
+
+    def _find_last_backup_time(self):
+        backups = (
+            self._backup_files(self.db.db_file) if self.backup_dir.is_dir() else []
+        )
+        if not backups:
+            return None
+
+        return datetime.datetime.fromtimestamp(backups[-1].stat().st_mtime)
+
+    def _cleanup_old_backups(self, db_file):
+        backups = self._backup_files(db_file)
+        for old_backup in backups[: max(len(backups) - self.backup_keep, 0)]:
+            try:
+                old_backup.unlink()
+                log.info(f"Removed old database backup: {old_backup}")
+            except OSError as e:
+                log.error(f"Failed to remove old database backup {old_backup}: {e}")
+
+    def _backup(self, db_file=None):
+        db_file = db_file or self.db.db_file
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_path = self.backup_dir / f"{Path(db_file).stem}_{timestamp}.db"
+        partial_path = backup_path.with_suffix(".db.partial")
+
+        self.db.backup(
+            str(partial_path), pages=DB_BACKUP_PAGES_PER_STEP, source_file=db_file
+        )
+        partial_path.rename(backup_path)
+
+        self._cleanup_old_backups(db_file)
+        return backup_path
+
+    async def checkpoint(self):
+        busy, wal_frames, checkpointed_frames = await self.db.run(self.db.checkpoint)
+        if busy:
+            log.debug(
+                f"WAL checkpoint was partial ({checkpointed_frames}/{wal_frames} frames)"
+            )
+
+    async def backup(self):
+        started = datetime.datetime.now()
+
+        # Not on the database thread: the backup uses its own connection and queries keep flowing
+        backup_path = await asyncio.to_thread(self._backup)
+
+        self.last_backup_at = datetime.datetime.now()
+        log.info(
+            f"Database backed up to {backup_path} in {(self.last_backup_at - started).total_seconds():.2f}s"
+        )
+
+    async def archive(self):
+        started = datetime.datetime.now()
+        cutoff = (
+            datetime.datetime.now(datetime.timezone.utc) - self.retention
+        ).strftime("%Y-%m-%d %H:%M:%S")
+
+        moved = 0
+        for manager in self.archive_managers:
+            # One short transaction per batch so other queries get the database in between
+            while True:
+                batch = await manager.aio.archive_before(cutoff, DB_ARCHIVE_BATCH_SIZE)
+                moved += batch
+                if batch < DB_ARCHIVE_BATCH_SIZE:
+                    break
+
+        self.last_archive_at = datetime.datetime.now()
+        if not moved:
+            return
+
+        freed_pages = await self.db.run(self.db.incremental_vacuum)
+        await asyncio.to_thread(self._backup, get_archive_path(self.db.db_file))
+        log.info(
+            f"Archived {moved} log rows older than {cutoff} to {ARCHIVE_SCHEMA} and freed {freed_pages} pages in {(self.last_archive_at - started).total_seconds():.2f}s"
+        )
+
+    def is_archive_due(self):
+        if not self.archive_managers:
+            return False
+        if self.last_archive_at is None:
+            return True
+
+        return datetime.datetime.now() - self.last_archive_at >= self.archive_interval
+
+    def is_backup_due(self):
+        if self.last_backup_at is None:
+            return True
+
+        return datetime.datetime.now() - self.last_backup_at >= self.backup_interval
+
+    @tasks.loop(minutes=5)
+    async def run(self):
+        try:
+            await self.checkpoint()
+        except Exception as e:
+            log.error(f"WAL checkpoint failed: {e}")
+
+        if self.is_archive_due():
+            try:
+                await self.archive()
+            except Exception as e:
+                log.error(f"Audit log archiving failed: {e}")
+
+        if not self.is_backup_due():
+            return
+
+        try:
+            await self.backup()
+        except Exception as e:
+            log.error(f"Database backup failed: {e}")
+
+    def start(self):
+        self.run.start()
+
+    def stop(self):
+        self.run.cancel()
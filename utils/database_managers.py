@@ -1,286 +1,938 @@
+import asyncio
+import datetime
+import functools
 import sqlite3
+import threading
+import time
+
 import config
 
+from utils.database import AsyncDatabaseManager, get_database
+from utils.database_migrations import ARCHIVE_SCHEMA, migrate
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds (999)
+SQLITE_MAX_PARAMETERS = 500
+
+AUDIT_LOG_FLUSH_SIZE = getattr(config, "AUDIT_LOG_FLUSH_SIZE", 50)
+AUDIT_LOG_FLUSH_INTERVAL_SECONDS = getattr(
+    config, "AUDIT_LOG_FLUSH_INTERVAL_SECONDS", 2
+)
+
+
+def utc_timestamp():
+    # Same format and timezone (UTC) as SQLite's CURRENT_TIMESTAMP
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
-class UserDatabaseManager:
+
+class DatabaseManager:
     def __init__(self, db_file):
         self.db_file = db_file
+        self.db = get_database(db_file)
+        self.aio = AsyncDatabaseManager(self)
         self.setup_database()
 
     def setup_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        migrate(self.db)
 
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS users
-        (
-            discord_id BIGINT PRIMARY KEY, 
-            discord_username TEXT NOT NULL,
-            discord_displayname TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'Active' CHECK (status IN ('Active', 'Inactive', 'Banned', 'Retired')),
-            team TEXT NOT NULL DEFAULT 'Unassigned' CHECK (team IN ('Unassigned', 'Green Team', 'Chalk Team', 'Red Section', 'Grey Section', 'Black Section', 'Red Talon')),
-            joined DATE DEFAULT NULL,
-            bohemia_id TEXT UNIQUE DEFAULT NULL
-        )
+    def transaction(self):
         """
+        Context manager grouping the manager calls made inside it into one transaction.
+        See Database.transaction.
+        """
+        return self.db.transaction()
+
+    def _schemas(self):
+        # The live tables plus their archived copies, when the archive is attached
+        return (
+            ("main", ARCHIVE_SCHEMA)
+            if self.db.is_attached(ARCHIVE_SCHEMA)
+            else ("main",)
         )
 
-        conn.commit()
-        conn.close()
+    def _history(self, table, include_archive):
+        # FROM clause for a log table, optionally spanning the archive too. SQLite pushes the
+        # outer WHERE into both halves of the UNION ALL, so their indexes are still used.
+        if not include_archive or not self.db.is_attached(ARCHIVE_SCHEMA):
+            return table
+
+        return f"(SELECT * FROM main.{table} UNION ALL SELECT * FROM {ARCHIVE_SCHEMA}.{table}) AS {table}"
 
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        return conn, conn.cursor()
+    def _archive_before(self, table, cutoff, batch_size):
+        """
+        Moves up to batch_size rows of table older than cutoff into the archive, oldest first,
+        in one transaction. Returns the number of rows moved.
+
+        Rows are copied with INSERT OR IGNORE before being deleted, so a batch interrupted
+        between the two files is simply finished by the next run.
+        """
+        with self.db.transaction(), self.db.cursor() as cursor:
+            # Ids grow with time, so walking them in order stops right after the old rows
+            cursor.execute(
+                f"SELECT MAX(id) FROM (SELECT id FROM main.{table} WHERE timestamp < ? ORDER BY id LIMIT ?)",
+                (cutoff, batch_size),
+            )
+            last_id = cursor.fetchone()[0]
+            if last_id is None:
+                return 0
+
+            cursor.execute(
+                f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.{table} SELECT * FROM main.{table} WHERE id <= ? AND timestamp < ?",
+                (last_id, cutoff),
+            )
+            cursor.execute(
+                f"DELETE FROM main.{table} WHERE id <= ? AND timestamp < ?",
+                (last_id, cutoff),
+            )
+            return cursor.rowcount
+
+
+class UserDirectory:
+    """
+    In-memory copy of the users table.
+
+    Holds every row keyed by discord_id plus a bohemia_id -> discord_id index, so hot-path
+    lookups never touch SQLite. Rows have the same shape as ``SELECT * FROM users``.
+    UserDatabaseManager keeps it consistent by applying each write after it is committed, so
+    inside a transaction reads keep returning the committed state until the transaction ends.
+    """
+
+    COLUMNS = (
+        "discord_id",
+        "discord_username",
+        "discord_displayname",
+        "status",
+        "team",
+        "joined",
+        "bohemia_id",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._discord_ids_by_bohemia_id = {}
+
+    def load(self, rows):
+        with self._lock:
+            self._rows = {row[0]: tuple(row) for row in rows}
+            self._discord_ids_by_bohemia_id = {
+                row[6]: row[0] for row in self._rows.values() if row[6] is not None
+            }
+
+    def get(self, discord_id):
+        return self._rows.get(discord_id)
+
+    def get_by_bohemia_id(self, bohemia_id):
+        discord_id = self._discord_ids_by_bohemia_id.get(bohemia_id)
+        return self._rows.get(discord_id) if discord_id is not None else None
+
+    def rows(self):
+        return list(self._rows.values())
+
+    def add(self, row):
+        with self._lock:
+            self._rows.setdefault(row[0], tuple(row))
+
+    def update(self, discord_id, **changes):
+        with self._lock:
+            row = self._rows.get(discord_id)
+            if row is None:
+                return
+
+            row = dict(zip(self.COLUMNS, row))
+            if "bohemia_id" in changes:
+                self._discord_ids_by_bohemia_id.pop(row["bohemia_id"], None)
+                if changes["bohemia_id"] is not None:
+                    self._discord_ids_by_bohemia_id[changes["bohemia_id"]] = discord_id
+            row.update(changes)
+
+            self._rows[discord_id] = tuple(row[column] for column in self.COLUMNS)
+
+    def remove(self, discord_id):
+        with self._lock:
+            row = self._rows.pop(discord_id, None)
+            if row is not None:
+                self._discord_ids_by_bohemia_id.pop(row[6], None)
+
+
+class UserDatabaseManager(DatabaseManager):
+    def __init__(self, db_file):
+        self.directory = UserDirectory()
+        super().__init__(db_file)
+
+    def setup_database(self):
+        super().setup_database()
+
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT * FROM users")
+            self.directory.load(cursor.fetchall())
 
     def create(self, id, username, display_name):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "INSERT OR IGNORE INTO users (discord_id, discord_username, discord_displayname) VALUES (?, ?, ?)",
-            (id, username, display_name),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "INSERT OR IGNORE INTO users (discord_id, discord_username, discord_displayname) VALUES (?, ?, ?)",
+                (id, username, display_name),
+            )
+            created = cursor.rowcount > 0
+
+        if created:
+            self.db.after_commit(
+                functools.partial(
+                    self.directory.add,
+                    (id, username, display_name, "Active", "Unassigned", None, None),
+                )
+            )
 
     def read(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT * FROM users WHERE discord_id = ?", (id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        return result
+        return self.directory.get(id)
 
     def read_discord_displayname(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "SELECT discord_displayname FROM users WHERE discord_id = ?", (id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-
-        return result[0] if result else None
+        result = self.directory.get(id)
+        return result[2] if result else None
 
     def read_team(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT team FROM users WHERE discord_id = ?", (id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        return result[0] if result else None
+        result = self.directory.get(id)
+        return result[4] if result else None
 
     def read_bohemia_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT bohemia_id FROM users WHERE discord_id = ?", (id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        return result[0] if result else None
+        result = self.directory.get(id)
+        return result[6] if result else None
 
     def read_by_bohemia_id(self, bohemia_id):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT * FROM users WHERE bohemia_id = ?", (bohemia_id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        return result
+        return self.directory.get_by_bohemia_id(bohemia_id)
 
     def update_team(self, id, team):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE users SET team = ? WHERE discord_id = ?",
-            (team, id),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE users SET team = ? WHERE discord_id = ?",
+                (team, id),
+            )
+        self.db.after_commit(functools.partial(self.directory.update, id, team=team))
 
     def update_status(self, id, status):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE users SET status = ? WHERE discord_id = ?",
-            (status, id),
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE users SET status = ? WHERE discord_id = ?",
+                (status, id),
+            )
+        self.db.after_commit(
+            functools.partial(self.directory.update, id, status=status)
         )
-        conn.commit()
-        conn.close()
 
     def update_bohemia_id(self, id, bohemia_id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE users SET bohemia_id = ? WHERE discord_id = ?",
-            (bohemia_id, id),
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE users SET bohemia_id = ? WHERE discord_id = ?",
+                (bohemia_id, id),
+            )
+        self.db.after_commit(
+            functools.partial(self.directory.update, id, bohemia_id=bohemia_id)
         )
-        conn.commit()
-        conn.close()
 
     def delete(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute("DELETE FROM users WHERE discord_id = ?", (id,))
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute("DELETE FROM users WHERE discord_id = ?", (id,))
+        self.db.after_commit(functools.partial(self.directory.remove, id))
 
     def reset_joined(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE users SET joined = date('now', 'localtime') WHERE discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
-
-    def get_users_for_active_message(self):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT discord_id, status, team, joined FROM users")
-        users = cursor.fetchall()
-        conn.close()
+        self.touch_last_seen_by_discord_ids([id])
 
-        return users
+    def touch_last_seen(self, bohemia_ids):
+        """
+        Stamps today's date as the last seen date of the given players.
 
+        Resolves bohemia ids through the user directory and hands the rest to
+        touch_last_seen_by_discord_ids. Returns the number of rows updated.
+        """
+        discord_ids = []
+        for bohemia_id in bohemia_ids:
+            row = self.directory.get_by_bohemia_id(bohemia_id)
+            if row:
+                discord_ids.append(row[0])
 
-class RoleLogDatabaseManager:
-    def __init__(self, db_file):
-        self.db_file = db_file
-        self.setup_database()
+        return self.touch_last_seen_by_discord_ids(discord_ids)
 
-    def setup_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def touch_last_seen_by_discord_ids(self, discord_ids):
+        """
+        Stamps today's date as the last seen date of the given users.
 
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS team_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            instigator_discord_id BIGINT NOT NULL,
-            target_discord_id BIGINT NOT NULL,
-            team TEXT NOT NULL CHECK (team IN ('Unassigned', 'Green Team', 'Chalk Team', 'Red Section', 'Grey Section', 'Black Section', 'Red Talon')),
-            details TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
+        Users already stamped today are skipped using the directory, and the rest are updated
+        with one set-based UPDATE (chunked to stay under SQLite's parameter limit), so repeated
+        calls within a day cost nothing. Returns the number of rows updated.
         """
-        )
+        today = datetime.date.today().isoformat()
+        discord_ids = [
+            discord_id
+            for discord_id in dict.fromkeys(discord_ids)
+            if self.directory.get(discord_id)
+            and self.directory.get(discord_id)[5] != today
+        ]
+        if not discord_ids:
+            return 0
+
+        updated = 0
+        with self.db.cursor() as cursor:
+            for idx in range(0, len(discord_ids), SQLITE_MAX_PARAMETERS):
+                chunk = discord_ids[idx : idx + SQLITE_MAX_PARAMETERS]
+                cursor.execute(
+                    f"UPDATE users SET joined = ? WHERE discord_id IN ({', '.join('?' for _ in chunk)})",
+                    (today, *chunk),
+                )
+                updated += cursor.rowcount
+
+        for discord_id in discord_ids:
+            self.db.after_commit(
+                functools.partial(self.directory.update, discord_id, joined=today)
+            )
+
+        return updated
+
+    def upsert_many(self, rows):
+        """
+        Inserts or updates many users with one executemany.
+        Rows are (discord_id, username, display_name, status, team); joined and bohemia_id
+        are left untouched on existing users.
+        """
+        if not rows:
+            return
+
+        with self.db.cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO users (discord_id, discord_username, discord_displayname, status, team) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (discord_id) DO UPDATE SET
+                    discord_username = excluded.discord_username,
+                    discord_displayname = excluded.discord_displayname,
+                    status = excluded.status,
+                    team = excluded.team
+                """,
+                rows,
+            )
+
+        def apply():
+            for discord_id, username, display_name, status, team in rows:
+                changes = dict(
+                    discord_username=username,
+                    discord_displayname=display_name,
+                    status=status,
+                    team=team,
+                )
+                if self.directory.get(discord_id):
+                    self.directory.update(discord_id, **changes)
+                else:
+                    self.directory.add((discord_id, *changes.values(), None, None))
+
+        self.db.after_commit(apply)
+
+    def get_team_rosters(self, teams):
+        """
+        Returns {team: [(discord_id, joined), ...]} with the active members of the given teams,
+        read from the trigger-maintained team_rosters table. Members are listed in the order
+        they were added to users, as the teams status message always showed them.
+        """
+        rosters = {team: [] for team in teams}
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                f"SELECT team_rosters.team, team_rosters.discord_id, team_rosters.joined FROM team_rosters JOIN users ON users.discord_id = team_rosters.discord_id WHERE team_rosters.team IN ({', '.join('?' for _ in rosters)}) ORDER BY users.rowid",
+                tuple(rosters),
+            )
+            for team, discord_id, joined in cursor.fetchall():
+                rosters[team].append((discord_id, joined))
 
-        conn.commit()
-        conn.close()
+        return rosters
 
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        return conn, conn.cursor()
 
+class RoleLogDatabaseManager(DatabaseManager):
     def create(self, instigator_id, target_id, team, details):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "INSERT INTO team_logs (instigator_discord_id, target_discord_id, team, details) VALUES (?, ?, ?, ?)",
-            (instigator_id, target_id, team, details),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO team_logs (instigator_discord_id, target_discord_id, team, details) VALUES (?, ?, ?, ?)",
+                (instigator_id, target_id, team, details),
+            )
+
+    def create_many(self, rows):
+        """
+        Inserts many team logs with a single commit.
+        Rows are (instigator_id, target_id, team, details, timestamp).
+        """
+        with self.db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO team_logs (instigator_discord_id, target_discord_id, team, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
 
     def read_by_target_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute("SELECT * FROM team_logs WHERE target_discord_id = ?", (id,))
-        result = cursor.fetchall()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT * FROM team_logs WHERE target_discord_id = ?", (id,))
+            return cursor.fetchall()
 
-        return result
+    def read_report_by_target_discord_id(
+        self, id, before_id=None, limit=10, include_archive=False
+    ):
+        """
+        Returns one page of a user's team logs, newest first, with display names resolved.
+
+        Rows are (id, instigator_displayname, target_displayname, team, details, timestamp).
+        Pass the id of the last row of a page as before_id to get the next page, and
+        include_archive to also page through archived rows.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                f"""
+            SELECT team_logs.id, instigator.discord_displayname, target.discord_displayname, team_logs.team, team_logs.details, team_logs.timestamp
+            FROM {self._history("team_logs", include_archive)}
+            LEFT JOIN users AS instigator ON instigator.discord_id = team_logs.instigator_discord_id
+            LEFT JOIN users AS target ON target.discord_id = team_logs.target_discord_id
+            WHERE team_logs.target_discord_id = ? AND team_logs.id < COALESCE(?, 9223372036854775807)
+            ORDER BY team_logs.id DESC
+            LIMIT ?
+            """,
+                (id, before_id, limit),
+            )
+            return cursor.fetchall()
+
+    def archive_before(self, cutoff, batch_size=1000):
+        return self._archive_before("team_logs", cutoff, batch_size)
 
     def mark_as_deleted_by_instigator_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE team_logs SET instigator_discord_id = -1 WHERE instigator_discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            for schema in self._schemas():
+                cursor.execute(
+                    f"UPDATE {schema}.team_logs SET instigator_discord_id = -1 WHERE instigator_discord_id = ?",
+                    (id,),
+                )
 
     def mark_as_deleted_by_target_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE team_logs SET target_discord_id = -1 WHERE target_discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            for schema in self._schemas():
+                cursor.execute(
+                    f"UPDATE {schema}.team_logs SET target_discord_id = -1 WHERE target_discord_id = ?",
+                    (id,),
+                )
 
 
-class MisconductLogDatabaseManager:
-    def __init__(self, db_file):
-        self.db_file = db_file
-        self.setup_database()
-
+class MisconductLogDatabaseManager(DatabaseManager):
     def setup_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        super().setup_database()
 
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS misconduct_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            instigator_discord_id BIGINT NOT NULL,
-            target_discord_id BIGINT NOT NULL,
-            victim_discord_id BIGINT,
-            category TEXT NOT NULL,
-            type TEXT NOT NULL,
-            details TEXT NOT NULL,
-            severity INT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-        )
-
-        conn.commit()
-        conn.close()
-
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        return conn, conn.cursor()
+        # The search index is missing when SQLite was built without FTS5
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'misconduct_logs_fts'"
+            )
+            self.has_search_index = cursor.fetchone() is not None
 
     def create(
         self, instigator_id, target_id, victim_id, category, type, details, severity
     ):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "INSERT INTO misconduct_logs (instigator_discord_id, target_discord_id, victim_discord_id, category, type, details, severity) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (instigator_id, target_id, victim_id, category, type, details, severity),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO misconduct_logs (instigator_discord_id, target_discord_id, victim_discord_id, category, type, details, severity) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    instigator_id,
+                    target_id,
+                    victim_id,
+                    category,
+                    type,
+                    details,
+                    severity,
+                ),
+            )
+
+    def create_many(self, rows):
+        """
+        Inserts many misconduct logs with a single commit.
+        Rows are (instigator_id, target_id, victim_id, category, type, details, severity, timestamp).
+        """
+        with self.db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO misconduct_logs (instigator_discord_id, target_discord_id, victim_discord_id, category, type, details, severity, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
 
     def read_by_target_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "SELECT * FROM misconduct_logs WHERE target_discord_id = ?", (id,)
-        )
-        result = cursor.fetchall()
-        conn.close()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM misconduct_logs WHERE target_discord_id = ?", (id,)
+            )
+            return cursor.fetchall()
 
-        return result
+    def read_rollup_by_target_discord_id(self, id):
+        """
+        Returns a user's misconduct counts from the trigger-maintained rollup as
+        (green_count, yellow_count, red_count, total_count, last_timestamp), or None.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT green_count, yellow_count, red_count, total_count, last_timestamp FROM misconduct_rollups WHERE discord_id = ? AND total_count > 0",
+                (id,),
+            )
+            return cursor.fetchone()
+
+    def read_report_by_target_discord_id(
+        self, id, before_id=None, limit=10, include_archive=False
+    ):
+        """
+        Returns one page of a user's misconduct logs, newest first, with display names resolved.
+
+        Rows are (id, instigator_displayname, target_displayname, victim_displayname, category,
+        type, details, severity, timestamp). victim_displayname is None when there is no victim.
+        Pass the id of the last row of a page as before_id to get the next page, and
+        include_archive to also page through archived rows.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                f"""
+            SELECT misconduct_logs.id, instigator.discord_displayname, target.discord_displayname, victim.discord_displayname, misconduct_logs.category, misconduct_logs.type, misconduct_logs.details, misconduct_logs.severity, misconduct_logs.timestamp
+            FROM {self._history("misconduct_logs", include_archive)}
+            LEFT JOIN users AS instigator ON instigator.discord_id = misconduct_logs.instigator_discord_id
+            LEFT JOIN users AS target ON target.discord_id = misconduct_logs.target_discord_id
+            LEFT JOIN users AS victim ON victim.discord_id = misconduct_logs.victim_discord_id
+            WHERE misconduct_logs.target_discord_id = ? AND misconduct_logs.id < COALESCE(?, 9223372036854775807)
+            ORDER BY misconduct_logs.id DESC
+            LIMIT ?
+            """,
+                (id, before_id, limit),
+            )
+            return cursor.fetchall()
+
+    def search(self, query, offset=0, limit=10):
+        """
+        Full-text search over misconduct details, type and category, best matches first.
+
+        Every word of query has to match, as a word prefix and case-insensitively. Rows have
+        the shape of read_report_by_target_discord_id, with details cut down to a snippet
+        around the matches. Page with offset. Without the FTS5 index this falls back to a
+        LIKE scan ordered by newest first. Only the main database is searched; archived rows
+        are not indexed.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        if not self.has_search_index:
+            return self._search_like(terms, offset, limit)
+
+        match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                """
+            SELECT misconduct_logs.id, instigator.discord_displayname, target.discord_displayname, victim.discord_displayname, misconduct_logs.category, misconduct_logs.type, snippet(misconduct_logs_fts, 0, '**', '**', '...', 32), misconduct_logs.severity, misconduct_logs.timestamp
+            FROM misconduct_logs_fts
+            JOIN misconduct_logs ON misconduct_logs.id = misconduct_logs_fts.rowid
+            LEFT JOIN users AS instigator ON instigator.discord_id = misconduct_logs.instigator_discord_id
+            LEFT JOIN users AS target ON target.discord_id = misconduct_logs.target_discord_id
+            LEFT JOIN users AS victim ON victim.discord_id = misconduct_logs.victim_discord_id
+            WHERE misconduct_logs_fts MATCH ?
+            ORDER BY misconduct_logs_fts.rank
+            LIMIT ? OFFSET ?
+            """,
+                (match, limit, offset),
+            )
+            return cursor.fetchall()
+
+    def _search_like(self, terms, offset, limit):
+        conditions = []
+        params = []
+        for term in terms:
+            pattern = "%{}%".format(
+                term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            )
+            conditions.append(
+                "(misconduct_logs.details LIKE ? ESCAPE '\\' OR misconduct_logs.type LIKE ? ESCAPE '\\' OR misconduct_logs.category LIKE ? ESCAPE '\\')"
+            )
+            params.extend((pattern, pattern, pattern))
+
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                f"""
+            SELECT misconduct_logs.id, instigator.discord_displayname, target.discord_displayname, victim.discord_displayname, misconduct_logs.category, misconduct_logs.type, misconduct_logs.details, misconduct_logs.severity, misconduct_logs.timestamp
+            FROM misconduct_logs
+            LEFT JOIN users AS instigator ON instigator.discord_id = misconduct_logs.instigator_discord_id
+            LEFT JOIN users AS target ON target.discord_id = misconduct_logs.target_discord_id
+            LEFT JOIN users AS victim ON victim.discord_id = misconduct_logs.victim_discord_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY misconduct_logs.id DESC
+            LIMIT ? OFFSET ?
+            """,
+                (*params, limit, offset),
+            )
+            return cursor.fetchall()
+
+    def archive_before(self, cutoff, batch_size=1000):
+        return self._archive_before("misconduct_logs", cutoff, batch_size)
 
     def mark_as_deleted_by_instigator_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE misconduct_logs SET instigator_discord_id = -1 WHERE instigator_discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            for schema in self._schemas():
+                cursor.execute(
+                    f"UPDATE {schema}.misconduct_logs SET instigator_discord_id = -1 WHERE instigator_discord_id = ?",
+                    (id,),
+                )
 
     def mark_as_deleted_by_target_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE misconduct_logs SET target_discord_id = -1 WHERE target_discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            for schema in self._schemas():
+                cursor.execute(
+                    f"UPDATE {schema}.misconduct_logs SET target_discord_id = -1 WHERE target_discord_id = ?",
+                    (id,),
+                )
+
+            # The triggers only see the live rows; recount -1 over the archive as well
+            cursor.execute(
+                "DELETE FROM misconduct_rollups WHERE discord_id IN (?, -1)", (id,)
+            )
+            cursor.execute(
+                f"""
+            INSERT INTO misconduct_rollups (discord_id, green_count, yellow_count, red_count, total_count, last_timestamp)
+            SELECT target_discord_id, SUM(severity = 0), SUM(severity = 1), SUM(severity = 2), COUNT(*), MAX(timestamp)
+            FROM {self._history("misconduct_logs", True)}
+            WHERE target_discord_id = -1
+            GROUP BY target_discord_id
+            """
+            )
 
     def mark_as_deleted_by_victim_discord_id(self, id):
-        conn, cursor = self.get_connection()
-        cursor.execute(
-            "UPDATE misconduct_logs SET victim_discord_id = -1 WHERE victim_discord_id = ?",
-            (id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.cursor() as cursor:
+            for schema in self._schemas():
+                cursor.execute(
+                    f"UPDATE {schema}.misconduct_logs SET victim_discord_id = -1 WHERE victim_discord_id = ?",
+                    (id,),
+                )
+
+
+class UserTransactions:
+    """
+    Composite user operations that span several tables.
+
+    Each method runs as one transaction with a single commit, so a crash halfway leaves the
+    database untouched. The team log of a member event is written in that same transaction,
+    so a change is never committed without its log. From the event loop use the awaitable
+    facade, e.g. ``await USER_TRANSACTIONS.aio.delete(user.id)``.
+    """
+
+    def __init__(self, users_dbm, role_logs_dbm, misconduct_logs_dbm):
+        self.users_dbm = users_dbm
+        self.role_logs_dbm = role_logs_dbm
+        self.misconduct_logs_dbm = misconduct_logs_dbm
+
+        self.db = users_dbm.db
+        self.aio = AsyncDatabaseManager(self)
+
+    def register(self, id, username, display_name, instigator_id, details):
+        with self.db.transaction():
+            self.users_dbm.create(id, username, display_name)
+            self.role_logs_dbm.create(instigator_id, id, "Unassigned", details)
+
+    def rejoin(self, id, details):
+        with self.db.transaction():
+            self.users_dbm.update_status(id, "Active")
+            self.role_logs_dbm.create(id, id, "Unassigned", details)
+
+    def leave(self, id, details):
+        with self.db.transaction():
+            self.users_dbm.update_status(id, "Inactive")
+            self.users_dbm.update_team(id, "Unassigned")
+            self.role_logs_dbm.create(id, id, "Unassigned", details)
+
+    def change_team(self, id, team, instigator_id, details, from_team=None):
+        """
+        Logs a team change and applies it; with from_team set, the user's team is only updated
+        if it currently is from_team (the log is written either way).
+        """
+        with self.db.transaction():
+            if from_team is None or self.users_dbm.read_team(id) == from_team:
+                self.users_dbm.update_team(id, team)
+            self.role_logs_dbm.create(instigator_id, id, team, details)
+
+    def reconcile(self, members, role_teams):
+        """
+        Brings the users table in line with the guild member list in one transaction.
+
+        members are (discord_id, username, display_name, team) for every guild member, where team
+        is the team of the member's highest team role or None. role_teams are the teams driven by
+        roles: a user on one of them without the matching role falls back to 'Unassigned', other
+        teams are left alone. Inactive members become Active, and Active users who are no longer
+        in the guild become Inactive and Unassigned, like on_member_join/on_member_remove.
+        Returns the number of users changed.
+        """
+        upserts = []
+        logs = []
+        timestamp = utc_timestamp()
+        member_ids = set()
+
+        for discord_id, username, display_name, role_team in members:
+            member_ids.add(discord_id)
+            row = self.users_dbm.directory.get(discord_id)
+
+            if row is None:
+                team = role_team or "Unassigned"
+                upserts.append((discord_id, username, display_name, "Active", team))
+                logs.append(
+                    (
+                        discord_id,
+                        discord_id,
+                        team,
+                        "User joined while the bot was offline",
+                        timestamp,
+                    )
+                )
+                continue
+
+            _, old_username, old_display_name, old_status, old_team, _, _ = row
+            status = "Active" if old_status == "Inactive" else old_status
+            team = old_team
+            if role_team:
+                team = role_team
+            elif old_team in role_teams:
+                team = "Unassigned"
+
+            if (username, display_name, status, team) == (
+                old_username,
+                old_display_name,
+                old_status,
+                old_team,
+            ):
+                continue
+
+            upserts.append((discord_id, username, display_name, status, team))
+            if status != old_status:
+                logs.append(
+                    (
+                        discord_id,
+                        discord_id,
+                        team,
+                        "User rejoined while the bot was offline",
+                        timestamp,
+                    )
+                )
+            elif team != old_team:
+                logs.append(
+                    (
+                        discord_id,
+                        discord_id,
+                        team,
+                        "User team synced with roles at startup",
+                        timestamp,
+                    )
+                )
+
+        for (
+            discord_id,
+            username,
+            display_name,
+            status,
+            team,
+            _,
+            _,
+        ) in self.users_dbm.directory.rows():
+            if discord_id in member_ids or status != "Active":
+                continue
+
+            upserts.append(
+                (discord_id, username, display_name, "Inactive", "Unassigned")
+            )
+            logs.append(
+                (
+                    discord_id,
+                    discord_id,
+                    "Unassigned",
+                    "User left while the bot was offline",
+                    timestamp,
+                )
+            )
+
+        with self.db.transaction():
+            self.users_dbm.upsert_many(upserts)
+            self.role_logs_dbm.create_many(logs)
+
+        return len(upserts)
+
+    def delete(self, id):
+        with self.db.transaction():
+            self.users_dbm.delete(id)
+            self.role_logs_dbm.mark_as_deleted_by_instigator_discord_id(id)
+            self.role_logs_dbm.mark_as_deleted_by_target_discord_id(id)
+            self.misconduct_logs_dbm.mark_as_deleted_by_instigator_discord_id(id)
+            self.misconduct_logs_dbm.mark_as_deleted_by_target_discord_id(id)
+            self.misconduct_logs_dbm.mark_as_deleted_by_victim_discord_id(id)
+
+
+class AuditLogQueue:
+    """
+    Write-behind queue for team and misconduct logs.
+
+    Event handlers enqueue rows without waiting on SQLite; a background task group-commits them
+    with executemany once AUDIT_LOG_FLUSH_SIZE rows are pending or AUDIT_LOG_FLUSH_INTERVAL_SECONDS
+    have passed. Rows keep the time they were enqueued as their timestamp.
+    Rows may be added from any thread. Logs that belong to a state change are not queued but
+    written in the change's own transaction (see UserTransactions).
+    Call stop() on shutdown; it waits for a flush in progress and then flushes what is left.
+    """
+
+    def __init__(
+        self,
+        role_logs_dbm,
+        misconduct_logs_dbm,
+        flush_size=AUDIT_LOG_FLUSH_SIZE,
+        flush_interval=AUDIT_LOG_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.role_logs_dbm = role_logs_dbm
+        self.misconduct_logs_dbm = misconduct_logs_dbm
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._team_logs = []
+        self._misconduct_logs = []
+        # Guards the pending rows, which the database thread appends to as well
+        self._rows_lock = threading.Lock()
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._loop = None
+        self._task = None
+        self._stopping = False
+
+        # Metrics
+        self.flushed_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    @property
+    def depth(self):
+        return len(self._team_logs) + len(self._misconduct_logs)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "flushed_rows": self.flushed_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+    def _enqueued(self):
+        if self.depth < self.flush_size:
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        # Called from the database thread, wake the flusher up on its own loop
+        if self._loop is not None and running_loop is not self._loop:
+            self._loop.call_soon_threadsafe(self._flush_requested.set)
+        else:
+            self._flush_requested.set()
+
+    def add_team_log(self, instigator_id, target_id, team, details):
+        with self._rows_lock:
+            self._team_logs.append(
+                (instigator_id, target_id, team, details, utc_timestamp())
+            )
+        self._enqueued()
+
+    def add_misconduct_log(
+        self, instigator_id, target_id, victim_id, category, type, details, severity
+    ):
+        with self._rows_lock:
+            self._misconduct_logs.append(
+                (
+                    instigator_id,
+                    target_id,
+                    victim_id,
+                    category,
+                    type,
+                    details,
+                    severity,
+                    utc_timestamp(),
+                )
+            )
+        self._enqueued()
+
+    def _write(self, dbm, rows):
+        try:
+            dbm.create_many(rows)
+        except sqlite3.IntegrityError:
+            # One bad row must not sink the whole batch; retry one by one and drop offenders
+            for row in rows:
+                try:
+                    dbm.create_many([row])
+                except sqlite3.IntegrityError as e:
+                    log.error(f"Dropped audit log row {row}: {e}")
+
+    async def flush(self):
+        """
+        Writes every pending row now. Also used before reads that must see the latest logs.
+        """
+        async with self._flush_lock:
+            with self._rows_lock:
+                team_logs, self._team_logs = self._team_logs, []
+                misconduct_logs, self._misconduct_logs = self._misconduct_logs, []
+            if not team_logs and not misconduct_logs:
+                return
+
+            flushed_rows = len(team_logs) + len(misconduct_logs)
+            started = time.perf_counter()
+            try:
+                if team_logs:
+                    await self.role_logs_dbm.db.run(
+                        self._write, self.role_logs_dbm, team_logs
+                    )
+                    team_logs = []
+                if misconduct_logs:
+                    await self.misconduct_logs_dbm.db.run(
+                        self._write, self.misconduct_logs_dbm, misconduct_logs
+                    )
+                    misconduct_logs = []
+            except Exception as e:
+                log.error(f"Failed to flush audit logs, will retry: {e}")
+                return
+            finally:
+                # Give the unwritten rows back, also when the flush is cancelled
+                if team_logs or misconduct_logs:
+                    with self._rows_lock:
+                        self._team_logs[:0] = team_logs
+                        self._misconduct_logs[:0] = misconduct_logs
+
+            elapsed = time.perf_counter() - started
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.flushed_rows += flushed_rows
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._loop = asyncio.get_running_loop()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        # Let the flush in progress finish instead of cancelling it halfway
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+
+        await self.flush()
+        log.info(f"Audit log queue stopped: {self.stats()}")
 
 
 USERS_DBM = UserDatabaseManager(config.USER_DB_PATH)
 ROLE_LOGS_DBM = RoleLogDatabaseManager(config.USER_DB_PATH)
 MISCONDUCT_LOGS_DBM = MisconductLogDatabaseManager(config.USER_DB_PATH)
+AUDIT_LOG_QUEUE = AuditLogQueue(ROLE_LOGS_DBM, MISCONDUCT_LOGS_DBM)
+USER_TRANSACTIONS = UserTransactions(USERS_DBM, ROLE_LOGS_DBM, MISCONDUCT_LOGS_DBM)
@@ -0,0 +1,552 @@
+import re
+import sqlite3
+from pathlib import Path
+
+import config
+
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+# Teams the CHECK constraints on users.team and team_logs.team were created with
+DEFAULT_TEAMS = (
+    "Unassigned",
+    "Green Team",
+    "Chalk Team",
+    "Red Section",
+    "Grey Section",
+    "Black Section",
+    "Red Talon",
+)
+
+# Teams that must be allowed by the CHECK constraints: the defaults, config.DB_TEAMS and every
+# team shown (config.TEAMS) or assigned by a role (config.TEAMS_ROLES). The constraints only
+# grow on startup; teams missing from these settings stay allowed. A team is only dropped
+# when named in config.DB_REMOVED_TEAMS, and its users are then moved to 'Unassigned' with a
+# team log each.
+REMOVED_TEAMS = tuple(
+    team for team in getattr(config, "DB_REMOVED_TEAMS", ()) if team != "Unassigned"
+)
+TEAMS = tuple(
+    team
+    for team in dict.fromkeys(
+        [
+            *DEFAULT_TEAMS,
+            *getattr(config, "DB_TEAMS", ()),
+            *getattr(config, "TEAMS", ()),
+            *(team for team, _ in getattr(config, "TEAMS_ROLES", {}).values() if team),
+        ]
+    )
+    if team not in REMOVED_TEAMS
+)
+
+# Tables whose team column carries the CHECK constraint
+TEAM_CHECKED_TABLES = ("users", "team_logs")
+
+# Schema name of the attached archive database that old audit rows are moved to
+ARCHIVE_SCHEMA = "archive"
+
+TEAM_CHECK_PATTERN = re.compile(r"CHECK\s*\(\s*team\s+IN\s*\(([^)]*)\)\s*\)", re.I)
+
+
+def _format_team_check(teams):
+    teams_sql = ", ".join("'{}'".format(team.replace("'", "''")) for team in teams)
+    return f"CHECK (team IN ({teams_sql}))"
+
+
+def _parse_team_check(table_sql):
+    match = TEAM_CHECK_PATTERN.search(table_sql)
+    if not match:
+        return None
+
+    return [team.strip().strip("'") for team in match.group(1).split(",")]
+
+
+def _create_base_tables(cursor):
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS users
+    (
+        discord_id BIGINT PRIMARY KEY,
+        discord_username TEXT NOT NULL,
+        discord_displayname TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'Active' CHECK (status IN ('Active', 'Inactive', 'Banned', 'Retired')),
+        team TEXT NOT NULL DEFAULT 'Unassigned' {_format_team_check(TEAMS)},
+        joined DATE DEFAULT NULL,
+        bohemia_id TEXT UNIQUE DEFAULT NULL
+    )
+    """
+    )
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS team_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        instigator_discord_id BIGINT NOT NULL,
+        target_discord_id BIGINT NOT NULL,
+        team TEXT NOT NULL {_format_team_check(TEAMS)},
+        details TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS misconduct_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        instigator_discord_id BIGINT NOT NULL,
+        target_discord_id BIGINT NOT NULL,
+        victim_discord_id BIGINT,
+        category TEXT NOT NULL,
+        type TEXT NOT NULL,
+        details TEXT NOT NULL,
+        severity INT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+
+
+def _create_secondary_indexes(cursor):
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_team ON users (team)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_status ON users (status)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_team_logs_target ON team_logs (target_discord_id)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_team_logs_instigator ON team_logs (instigator_discord_id)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_misconduct_logs_target ON misconduct_logs (target_discord_id)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_misconduct_logs_instigator ON misconduct_logs (instigator_discord_id)",
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_misconduct_logs_victim ON misconduct_logs (victim_discord_id)",
+    )
+
+
+def _create_misconduct_search_index(cursor):
+    # External-content FTS5 index: only the index is stored, the text stays in misconduct_logs
+    try:
+        cursor.execute(
+            """
+        CREATE VIRTUAL TABLE IF NOT EXISTS misconduct_logs_fts USING fts5(
+            details,
+            type,
+            category,
+            content='misconduct_logs',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+        )
+    except sqlite3.OperationalError as e:
+        log.warning(
+            f"SQLite was built without FTS5, misconduct search falls back to LIKE: {e}"
+        )
+        return
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS misconduct_logs_fts_insert AFTER INSERT ON misconduct_logs BEGIN
+        INSERT INTO misconduct_logs_fts (rowid, details, type, category)
+        VALUES (new.id, new.details, new.type, new.category);
+    END
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS misconduct_logs_fts_delete AFTER DELETE ON misconduct_logs BEGIN
+        INSERT INTO misconduct_logs_fts (misconduct_logs_fts, rowid, details, type, category)
+        VALUES ('delete', old.id, old.details, old.type, old.category);
+    END
+    """
+    )
+    # Anonymising a log only touches the discord id columns and leaves the index alone
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS misconduct_logs_fts_update AFTER UPDATE OF details, type, category ON misconduct_logs BEGIN
+        INSERT INTO misconduct_logs_fts (misconduct_logs_fts, rowid, details, type, category)
+        VALUES ('delete', old.id, old.details, old.type, old.category);
+        INSERT INTO misconduct_logs_fts (rowid, details, type, category)
+        VALUES (new.id, new.details, new.type, new.category);
+    END
+    """
+    )
+    cursor.execute(
+        "INSERT INTO misconduct_logs_fts (misconduct_logs_fts) VALUES ('rebuild')"
+    )
+
+
+def refresh_team_rosters(cursor):
+    """
+    Recomputes team_rosters from users.
+    Needed after bulk rewrites of users that bypass its triggers, such as a table rebuild.
+    """
+    cursor.execute("DELETE FROM team_rosters")
+    cursor.execute(
+        "INSERT INTO team_rosters (team, discord_id, joined) SELECT team, discord_id, joined FROM users WHERE status = 'Active'"
+    )
+
+
+def _create_summary_tables(cursor):
+    # Active members per team, kept in step with users by the triggers below
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS team_rosters (
+        team TEXT NOT NULL,
+        discord_id BIGINT NOT NULL,
+        joined DATE DEFAULT NULL,
+        PRIMARY KEY (team, discord_id)
+    ) WITHOUT ROWID
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS misconduct_rollups (
+        discord_id BIGINT PRIMARY KEY,
+        green_count INT NOT NULL DEFAULT 0,
+        yellow_count INT NOT NULL DEFAULT 0,
+        red_count INT NOT NULL DEFAULT 0,
+        total_count INT NOT NULL DEFAULT 0,
+        last_timestamp DATETIME DEFAULT NULL
+    ) WITHOUT ROWID
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS users_team_rosters_insert AFTER INSERT ON users WHEN new.status = 'Active' BEGIN
+        INSERT INTO team_rosters (team, discord_id, joined) VALUES (new.team, new.discord_id, new.joined);
+    END
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS users_team_rosters_delete AFTER DELETE ON users WHEN old.status = 'Active' BEGIN
+        DELETE FROM team_rosters WHERE team = old.team AND discord_id = old.discord_id;
+    END
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS users_team_rosters_update AFTER UPDATE OF discord_id, status, team, joined ON users BEGIN
+        DELETE FROM team_rosters WHERE old.status = 'Active' AND team = old.team AND discord_id = old.discord_id;
+        INSERT INTO team_rosters (team, discord_id, joined)
+        SELECT new.team, new.discord_id, new.joined WHERE new.status = 'Active';
+    END
+    """
+    )
+
+    # Misconduct counts per accused user, by severity (0 green, 1 yellow, 2 red). They count the
+    # full history: rows are only deleted when they are moved to the archive, which has no
+    # trigger. A trigger cannot read the attached archive, but archived rows are older than the
+    # live ones, so an emptied user keeps its last_timestamp instead of losing it.
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS misconduct_rollups_insert AFTER INSERT ON misconduct_logs BEGIN
+        INSERT INTO misconduct_rollups (discord_id, green_count, yellow_count, red_count, total_count, last_timestamp)
+        VALUES (new.target_discord_id, new.severity = 0, new.severity = 1, new.severity = 2, 1, new.timestamp)
+        ON CONFLICT (discord_id) DO UPDATE SET
+            green_count = green_count + excluded.green_count,
+            yellow_count = yellow_count + excluded.yellow_count,
+            red_count = red_count + excluded.red_count,
+            total_count = total_count + 1,
+            last_timestamp = MAX(COALESCE(last_timestamp, ''), excluded.last_timestamp);
+    END
+    """
+    )
+    cursor.execute(
+        """
+    CREATE TRIGGER IF NOT EXISTS misconduct_rollups_update AFTER UPDATE OF target_discord_id, severity, timestamp ON misconduct_logs BEGIN
+        UPDATE misconduct_rollups SET
+            green_count = green_count - (old.severity = 0),
+            yellow_count = yellow_count - (old.severity = 1),
+            red_count = red_count - (old.severity = 2),
+            total_count = total_count - 1,
+            last_timestamp = COALESCE(
+                (SELECT MAX(timestamp) FROM misconduct_logs WHERE target_discord_id = old.target_discord_id),
+                last_timestamp
+            )
+        WHERE discord_id = old.target_discord_id;
+        INSERT INTO misconduct_rollups (discord_id, green_count, yellow_count, red_count, total_count, last_timestamp)
+        VALUES (new.target_discord_id, new.severity = 0, new.severity = 1, new.severity = 2, 1, new.timestamp)
+        ON CONFLICT (discord_id) DO UPDATE SET
+            green_count = green_count + excluded.green_count,
+            yellow_count = yellow_count + excluded.yellow_count,
+            red_count = red_count + excluded.red_count,
+            total_count = total_count + 1,
+            last_timestamp = MAX(COALESCE(last_timestamp, ''), excluded.last_timestamp);
+    END
+    """
+    )
+
+    refresh_team_rosters(cursor)
+    cursor.execute(
+        """
+    INSERT INTO misconduct_rollups (discord_id, green_count, yellow_count, red_count, total_count, last_timestamp)
+    SELECT target_discord_id, SUM(severity = 0), SUM(severity = 1), SUM(severity = 2), COUNT(*), MAX(timestamp)
+    FROM misconduct_logs
+    GROUP BY target_discord_id
+    """
+    )
+
+
+# Ordered list of (version, description, migration). Never edit an entry once it has shipped;
+# append a new one instead.
+MIGRATIONS = [
+    (1, "Create users, team_logs and misconduct_logs tables", _create_base_tables),
+    (
+        2,
+        "Add secondary indexes on log and user lookup columns",
+        _create_secondary_indexes,
+    ),
+    (
+        3,
+        "Add full-text search index over misconduct details, type and category",
+        _create_misconduct_search_index,
+    ),
+    (
+        4,
+        "Add trigger-maintained team roster and misconduct rollup tables",
+        _create_summary_tables,
+    ),
+]
+
+
+def rebuild_table_team_check(cursor, table, teams):
+    """
+    Rebuilds a table so that its team CHECK constraint allows exactly the given teams.
+
+    SQLite cannot alter a CHECK constraint in place, so this follows the documented
+    create-copy-drop-rename procedure and re-creates the table's indexes and triggers.
+    Users on a removed team are moved to 'Unassigned' and a team log is written for each of
+    them; log rows keep their historical team, which stays allowed in the log table's constraint.
+    """
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    table_sql = cursor.fetchone()[0]
+
+    if table == "users":
+        placeholders = ", ".join("?" for _ in teams)
+        cursor.execute(
+            f"SELECT discord_id, team FROM users WHERE team NOT IN ({placeholders})",
+            tuple(teams),
+        )
+        moved_users = cursor.fetchall()
+        if moved_users:
+            log.warning(
+                f"Moving {len(moved_users)} users off removed teams "
+                f"{sorted({team for _, team in moved_users})} to 'Unassigned'"
+            )
+            cursor.executemany(
+                "INSERT INTO team_logs (instigator_discord_id, target_discord_id, team, details) VALUES (?, ?, 'Unassigned', ?)",
+                [
+                    (discord_id, discord_id, f"Team {team} was removed")
+                    for discord_id, team in moved_users
+                ],
+            )
+
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,),
+    )
+    dependent_sqls = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if table == "users":
+        placeholders = ", ".join("?" for _ in teams)
+        select_columns = ", ".join(
+            (
+                f"CASE WHEN team IN ({placeholders}) THEN team ELSE 'Unassigned' END"
+                if column == "team"
+                else column
+            )
+            for column in columns
+        )
+        params = tuple(teams)
+    else:
+        cursor.execute(f"SELECT DISTINCT team FROM {table}")
+        historical_teams = [row[0] for row in cursor.fetchall()]
+        teams = tuple(dict.fromkeys([*teams, *historical_teams]))
+        select_columns = ", ".join(columns)
+        params = ()
+
+    new_table = f"{table}__rebuild"
+    new_table_sql = TEAM_CHECK_PATTERN.sub(
+        lambda match: _format_team_check(teams), table_sql, count=1
+    )
+    new_table_sql = re.sub(
+        rf"^CREATE TABLE\s+(IF NOT EXISTS\s+)?\"?{table}\"?",
+        f"CREATE TABLE {new_table}",
+        new_table_sql.strip(),
+        count=1,
+        flags=re.I,
+    )
+
+    cursor.execute(new_table_sql)
+    cursor.execute(
+        f"INSERT INTO {new_table} ({', '.join(columns)}) SELECT {select_columns} FROM {table}",
+        params,
+    )
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for sql in dependent_sqls:
+        cursor.execute(sql)
+
+    log.info(f"Rebuilt {table} with team constraint {list(teams)}")
+
+
+def _sync_team_checks(cursor):
+    for table in TEAM_CHECKED_TABLES:
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        )
+        result = cursor.fetchone()
+        if not result:
+            continue
+
+        current_teams = _parse_team_check(result[0])
+        if current_teams is None:
+            log.error(f"Could not find the team constraint of table {table}")
+            continue
+
+        unconfigured_teams = [
+            team
+            for team in current_teams
+            if team not in TEAMS and team not in REMOVED_TEAMS
+        ]
+        if unconfigured_teams:
+            log.warning(
+                f"Teams {unconfigured_teams} of the {table} constraint are not configured and "
+                "stay allowed; list them in DB_REMOVED_TEAMS to drop them"
+            )
+
+        # Only ever widen, except for teams removed on purpose (log rows keep their history)
+        teams = list(dict.fromkeys([*current_teams, *TEAMS]))
+        if table == "users":
+            teams = [team for team in teams if team not in REMOVED_TEAMS]
+
+        if set(teams) != set(current_teams):
+            rebuild_table_team_check(cursor, table, teams)
+            if table == "users":
+                # The rebuild copies rows without firing the roster triggers
+                refresh_team_rosters(cursor)
+
+
+def get_archive_path(db_file):
+    """
+    Returns the archive database file of a database: config.DB_ARCHIVE_PATH for the user
+    database, otherwise <name>_archive.db next to it.
+    """
+    if db_file == config.USER_DB_PATH and getattr(config, "DB_ARCHIVE_PATH", None):
+        return config.DB_ARCHIVE_PATH
+
+    path = Path(db_file)
+    return str(path.with_name(f"{path.stem}_archive{path.suffix}"))
+
+
+def _create_archive_tables(cursor):
+    # Same columns as the live tables. Ids are kept from the live tables, and team has no
+    # CHECK because archived rows carry whatever teams existed at the time.
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.team_logs (
+        id INTEGER PRIMARY KEY,
+        instigator_discord_id BIGINT NOT NULL,
+        target_discord_id BIGINT NOT NULL,
+        team TEXT NOT NULL,
+        details TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.misconduct_logs (
+        id INTEGER PRIMARY KEY,
+        instigator_discord_id BIGINT NOT NULL,
+        target_discord_id BIGINT NOT NULL,
+        victim_discord_id BIGINT,
+        category TEXT NOT NULL,
+        type TEXT NOT NULL,
+        details TEXT NOT NULL,
+        severity INT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+    for table, column in (
+        ("team_logs", "target_discord_id"),
+        ("team_logs", "instigator_discord_id"),
+        ("misconduct_logs", "target_discord_id"),
+        ("misconduct_logs", "instigator_discord_id"),
+        ("misconduct_logs", "victim_discord_id"),
+    ):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_{table}_{column.split('_')[0]} ON {table} ({column})"
+        )
+
+
+def _enable_incremental_vacuum(db):
+    with db.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            return
+
+    # An existing file only switches auto_vacuum mode through a full VACUUM, done once
+    log.info(f"Converting {db.db_file} to incremental auto_vacuum")
+    with db.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+
+
+def migrate(db):
+    """
+    Brings the database schema up to date.
+
+    Applies every migration newer than the recorded schema_version, each in its own
+    transaction, then makes sure the team CHECK constraints allow TEAMS. Finally attaches the
+    archive database and creates its tables. Safe to call on every startup.
+    """
+    with db.cursor() as cursor:
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+        )
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current_version = cursor.fetchone()[0]
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        with db.transaction(), db.cursor() as cursor:
+            migration(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+        log.info(f"Applied database migration {version}: {description}")
+
+    with db.transaction(), db.cursor() as cursor:
+        _sync_team_checks(cursor)
+
+    _enable_incremental_vacuum(db)
+
+    db.attach(get_archive_path(db.db_file), ARCHIVE_SCHEMA)
+    with db.transaction(), db.cursor() as cursor:
+        _create_archive_tables(cursor)
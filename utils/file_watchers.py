@@ -1,6 +1,8 @@
+import asyncio
 import json
 import os
 import threading
+import time
 from pathlib import Path
 
 from watchdog.observers import Observer
@@ -15,6 +17,11 @@ class GenericFileWatcher(FileSystemEventHandler):
     def __init__(self, filepath):
         self.filepath = filepath
 
+        # name -> (event loop, callback) notified after the file is reloaded
+        self._subscribers = {}
+        # time.monotonic() of the last change to the file, None until one is seen
+        self.last_modified = None
+
     def _initiate_or_reset_data(self):
         raise NotImplementedError("Subclasses must implement this method.")
 
@@ -26,12 +33,34 @@ class GenericFileWatcher(FileSystemEventHandler):
 
     def on_modified(self, event):
         if os.path.abspath(event.src_path) == os.path.abspath(self.filepath):
+            self.last_modified = time.monotonic()
             data = self._load_file()
             if data:
                 self._sanitize_data(data)
             else:
                 self._initiate_or_reset_data()
 
+            self._publish()
+
+    def subscribe(self, name, callback):
+        """
+        Calls callback() on the running event loop each time the file is reloaded.
+        The watchdog thread hands the call over with call_soon_threadsafe, so callback runs on
+        the loop and must not block. Subscribing again under the same name replaces the callback.
+        """
+        self._subscribers[name] = (asyncio.get_running_loop(), callback)
+
+    def _publish(self):
+        for loop, callback in list(self._subscribers.values()):
+            if loop.is_closed():
+                continue
+
+            try:
+                loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                # The loop was closed in the meantime (shutdown)
+                pass
+
     def start(self):
         observer = Observer()
         observer.schedule(
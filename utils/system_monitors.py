@@ -0,0 +1,307 @@
+import collections
+import subprocess
+import threading
+import time
+
+import config
+import psutil
+
+from utils.loggers import get_logger
+
+log = get_logger(__name__)
+
+SYSTEM_MONITOR_INTERVAL_SECONDS = getattr(config, "SYSTEM_MONITOR_INTERVAL_SECONDS", 5)
+# 720 samples every 5 seconds keep the last hour
+SYSTEM_MONITOR_HISTORY_SIZE = getattr(config, "SYSTEM_MONITOR_HISTORY_SIZE", 720)
+SYSTEM_MONITOR_DISK_PATH = getattr(config, "SYSTEM_MONITOR_DISK_PATH", "/")
+# Server number -> systemd unit of the game server
+SERVER_UNITS = getattr(
+    config,
+    "SERVER_UNITS",
+    {
+        number: f"arma-reforger-server-{number}"
+        for number in getattr(config, "SERVER_NUMBERS", (1, 2, 3))
+    },
+)
+# How often to look for the main PID of a unit that is not running
+SERVER_PROCESS_RESOLVE_INTERVAL_SECONDS = getattr(
+    config, "SERVER_PROCESS_RESOLVE_INTERVAL_SECONDS", 30
+)
+
+SystemSample = collections.namedtuple(
+    "SystemSample",
+    [
+        "timestamp",
+        "cpu",
+        "memory",
+        "disk",
+        "load_1",
+        "load_5",
+        "load_15",
+        "net_sent_per_second",
+        "net_recv_per_second",
+    ],
+)
+
+ProcessSample = collections.namedtuple(
+    "ProcessSample",
+    [
+        "timestamp",
+        "pid",
+        "cpu",
+        "rss",
+        "threads",
+        "read_per_second",
+        "write_per_second",
+    ],
+)
+
+
+class ServerProcessMonitor:
+    """
+    Samples the main process of a systemd unit.
+
+    The psutil.Process of the unit's MainPID is resolved once and kept; it is resolved again
+    only after that process exits (the unit was stopped or restarted), and at most every
+    resolve_interval seconds while the unit is down. CPU usage is measured since the previous
+    sample and scaled to the whole host like the system CPU usage, I/O counters are turned
+    into bytes per second.
+    """
+
+    def __init__(self, unit, resolve_interval=SERVER_PROCESS_RESOLVE_INTERVAL_SECONDS):
+        self.unit = unit
+        self.resolve_interval = resolve_interval
+
+        self._process = None
+        self._last_resolve = None
+        self._last_io = None
+        self._cpu_count = psutil.cpu_count() or 1
+
+    def _resolve(self):
+        result = subprocess.run(
+            ["systemctl", "show", "--property=MainPID", "--value", self.unit],
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=5,
+        )
+        pid = int(result.stdout.strip() or 0)
+        if not pid:
+            return None
+
+        process = psutil.Process(pid)
+        # The first cpu_percent only sets the baseline for the next sample
+        process.cpu_percent(interval=None)
+        self._last_io = None
+        log.info(f"Resolved {self.unit} to PID {pid}")
+        return process
+
+    def _get_process(self):
+        if self._process is not None and self._process.is_running():
+            return self._process
+
+        self._process = None
+        now = time.monotonic()
+        if (
+            self._last_resolve is not None
+            and now - self._last_resolve < self.resolve_interval
+        ):
+            return None
+
+        self._last_resolve = now
+        try:
+            self._process = self._resolve()
+        except (OSError, ValueError, subprocess.SubprocessError, psutil.Error) as e:
+            log.error(f"Failed to resolve the main process of {self.unit}: {e}")
+
+        return self._process
+
+    def sample(self):
+        """
+        Returns a ProcessSample of the unit's main process, or None when it is not running.
+        """
+        process = self._get_process()
+        if process is None:
+            return None
+
+        now = time.time()
+        try:
+            with process.oneshot():
+                cpu = process.cpu_percent(interval=None) / self._cpu_count
+                rss = process.memory_info().rss
+                threads = process.num_threads()
+                try:
+                    io = process.io_counters()
+                except (psutil.AccessDenied, AttributeError):
+                    io = None
+        except psutil.NoSuchProcess:
+            self._process = None
+            return None
+
+        read_per_second = write_per_second = 0.0
+        if io is not None and self._last_io is not None:
+            last_time, last_io = self._last_io
+            elapsed = max(now - last_time, 1e-6)
+            read_per_second = max(io.read_bytes - last_io.read_bytes, 0) / elapsed
+            write_per_second = max(io.write_bytes - last_io.write_bytes, 0) / elapsed
+        self._last_io = (now, io) if io is not None else None
+
+        return ProcessSample(
+            now,
+            process.pid,
+            cpu,
+            rss,
+            threads,
+            read_per_second,
+            write_per_second,
+        )
+
+
+class SystemMonitor:
+    """
+    Samples CPU, memory, disk, load average and network throughput on a background thread.
+
+    Samples are taken every interval seconds into a ring buffer of history_size entries, so
+    readers on the event loop get the latest values and min/avg/max windows without blocking.
+    CPU usage is measured over the time since the previous sample, and network counters are
+    turned into bytes per second from the difference between two samples.
+
+    The main process of each game server unit in server_units is sampled on the same thread;
+    only its latest sample is kept.
+    """
+
+    def __init__(
+        self,
+        interval=SYSTEM_MONITOR_INTERVAL_SECONDS,
+        history_size=SYSTEM_MONITOR_HISTORY_SIZE,
+        disk_path=SYSTEM_MONITOR_DISK_PATH,
+        server_units=SERVER_UNITS,
+    ):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.server_processes = {
+            server_number: ServerProcessMonitor(unit)
+            for server_number, unit in server_units.items()
+        }
+
+        self._history = collections.deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_net = None
+        self._server_samples = {}
+
+    def _sample(self):
+        now = time.time()
+        cpu = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory().percent
+        disk = psutil.disk_usage(self.disk_path).percent
+        load_1, load_5, load_15 = psutil.getloadavg()
+
+        net = psutil.net_io_counters()
+        net_sent_per_second = net_recv_per_second = 0.0
+        if self._last_net is not None:
+            last_time, last_net = self._last_net
+            elapsed = max(now - last_time, 1e-6)
+            net_sent_per_second = max(net.bytes_sent - last_net.bytes_sent, 0) / elapsed
+            net_recv_per_second = max(net.bytes_recv - last_net.bytes_recv, 0) / elapsed
+        self._last_net = (now, net)
+
+        return SystemSample(
+            now,
+            cpu,
+            memory,
+            disk,
+            load_1,
+            load_5,
+            load_15,
+            net_sent_per_second,
+            net_recv_per_second,
+        )
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                sample = self._sample()
+            except Exception as e:
+                log.error(f"Failed to sample system metrics: {e}")
+                continue
+
+            server_samples = {}
+            for server_number, monitor in self.server_processes.items():
+                try:
+                    server_samples[server_number] = monitor.sample()
+                except Exception as e:
+                    log.error(f"Failed to sample {monitor.unit}: {e}")
+
+            with self._lock:
+                self._history.append(sample)
+                self._server_samples = server_samples
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        # The first cpu_percent and network reads only set the baseline for the next sample
+        psutil.cpu_percent(interval=None)
+        self._last_net = (time.time(), psutil.net_io_counters())
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="talon-system-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def latest(self):
+        """
+        Returns the most recent SystemSample, or None before the first sample is taken.
+        """
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+    def server_process(self, server_number):
+        """
+        Returns the latest ProcessSample of a game server, or None when it is not running.
+        """
+        with self._lock:
+            return self._server_samples.get(server_number)
+
+    def history(self, seconds=None):
+        """
+        Returns the samples of the last seconds (all of them when None), oldest first.
+        """
+        with self._lock:
+            samples = list(self._history)
+
+        if seconds is None:
+            return samples
+
+        cutoff = time.time() - seconds
+        return [sample for sample in samples if sample.timestamp >= cutoff]
+
+    def window(self, seconds=None):
+        """
+        Returns {field: (min, avg, max)} over the samples of the last seconds,
+        or None when there are no samples in that window.
+        """
+        samples = self.history(seconds)
+        if not samples:
+            return None
+
+        stats = {}
+        for field in SystemSample._fields[1:]:
+            values = [getattr(sample, field) for sample in samples]
+            stats[field] = (min(values), sum(values) / len(values), max(values))
+
+        return stats
+
+
+SYSTEM_MONITOR = SystemMonitor()
@@ -1,5 +1,6 @@
 import json
 import os
+import socket
 import subprocess
 import time
 from datetime import date, datetime, timedelta
@@ -12,92 +13,92 @@ from utils.loggers import get_logger
 log = get_logger(__name__)
 
 
+# Listening ports are read once and reused for this long, so every server status message of a
+# refresh cycle answers from the same snapshot
+PORT_SNAPSHOT_MAX_AGE_SECONDS = 10
+
+# /proc/net/tcp* state of a listening socket; bound UDP sockets have no listen state
+_TCP_LISTEN_STATE = "0A"
+_PROC_NET_FILES = {
+    "/proc/net/tcp": True,
+    "/proc/net/tcp6": True,
+    "/proc/net/udp": False,
+    "/proc/net/udp6": False,
+}
+
+_port_snapshot = {"ports": frozenset(), "taken_at": None}
+
+
+def _read_proc_net_ports():
+    ports = set()
+    for path, is_tcp in _PROC_NET_FILES.items():
+        try:
+            with open(path, "r") as file:
+                next(file)  # Header
+                for line in file:
+                    fields = line.split()
+                    if is_tcp and fields[3] != _TCP_LISTEN_STATE:
+                        continue
+                    ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+        except FileNotFoundError:
+            # No IPv6 on this host
+            continue
+
+    return ports
+
+
+def _read_psutil_ports():
+    return {
+        connection.laddr.port
+        for connection in psutil.net_connections(kind="inet")
+        if connection.laddr
+        and (
+            connection.type == socket.SOCK_DGRAM
+            or connection.status == psutil.CONN_LISTEN
+        )
+    }
+
+
+def get_listening_ports() -> frozenset:
+    """
+    Returns the local TCP ports in LISTEN state and the bound UDP ports (like ss -tuln).
+    Read from /proc/net (psutil elsewhere) at most once per PORT_SNAPSHOT_MAX_AGE_SECONDS.
+    """
+    now = time.monotonic()
+    taken_at = _port_snapshot["taken_at"]
+    if taken_at is not None and now - taken_at < PORT_SNAPSHOT_MAX_AGE_SECONDS:
+        return _port_snapshot["ports"]
+
+    try:
+        if os.path.exists("/proc/net/tcp"):
+            ports = _read_proc_net_ports()
+        else:
+            ports = _read_psutil_ports()
+    except Exception as e:
+        log.error(f"Unexpected error reading listening ports: {e}")
+        ports = set()
+
+    _port_snapshot["ports"] = frozenset(ports)
+    _port_snapshot["taken_at"] = now
+    return _port_snapshot["ports"]
+
+
 # Check if a specific port is listening (i.e. gameserver)
 def is_port_listening(port: int) -> bool:
     try:
         if not (1 <= port <= 65535):
             raise ValueError("Port number must be between 1 and 65535")
 
-        result = subprocess.run(
-            ["ss", "-tuln", f"sport = :{port}"],
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=5,
-        )
-
-        if result.returncode != 0:
-            log.error(
-                f"ss command failed with return code {result.returncode}: {result.stderr.strip()}"
-            )
-            return False
-
-        return any(f":{port}" in line for line in result.stdout.splitlines())
+        return port in get_listening_ports()
 
     except ValueError as e:
         log.error(f"Invalid port {port}: {e}")
         return False
-    except subprocess.TimeoutExpired:
-        log.error("ss command timed out")
-        return False
-    except subprocess.CalledProcessError as e:
-        log.error(f"ss command failed: {e}")
-        return False
     except Exception as e:
         log.error(f"Unexpected error checking port {port}: {e}")
         return False
 
 
-# CPU, Memory and Disk usage
-def get_server_utilization() -> tuple[float, float, float]:
-    try:
-        cpu = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory().percent
-        disk = psutil.disk_usage("/").percent
-
-        return cpu, memory, disk
-
-    except Exception as e:
-        log.error(f"Error getting server utilization via psutil: {e}")
-
-        # Fallback to subprocess method if psutil fails
-        try:
-            cpu = float(
-                subprocess.check_output(
-                    "top -bn1 | grep 'Cpu(s)' | awk '{print $2}'", shell=True
-                )
-                .decode()
-                .strip()
-            )
-        except Exception as e:
-            log.error(f"Error getting CPU usage via subprocess: {e}")
-            cpu = 0.0
-
-        try:
-            memory = float(
-                subprocess.check_output(
-                    "free -m | grep Mem | awk '{print $3/$2 * 100.0}'", shell=True
-                )
-                .decode()
-                .strip()
-            )
-        except Exception as e:
-            log.error(f"Error getting memory usage via subprocess: {e}")
-            memory = 0.0
-
-        try:
-            disk = float(
-                subprocess.check_output("df -h / | awk 'NR==2 {print $5}'", shell=True)
-                .decode()
-                .strip()[:-1]
-            )
-        except Exception as e:
-            log.error(f"Error getting disk usage via subprocess: {e}")
-            disk = 0.0
-
-        return cpu, memory, disk
-
-
 # Update arma reforger
 def update_arma_reforger() -> bool:
     try:
@@ -222,59 +223,6 @@ def stop_arma_reforger_server(server_number) -> bool:
         return False
 
 
-def get_active_messages_id(activemessagesids_path, entry):
-    # Check if the file exists
-    if not Path(activemessagesids_path).is_file():
-        print(f"File {activemessagesids_path} does not exist. Creating a new file.")
-
-        # Create the file if it doesn't exist
-        with open(activemessagesids_path, "w") as file:
-            json.dump({}, file, indent=4)
-
-        raise FileNotFoundError(
-            f"File {activemessagesids_path} does not exist. A new file has been created."
-        )
-
-    # Read the JSON file
-    data = {}
-    with open(activemessagesids_path, "r") as file:
-        data = json.load(file)
-
-    # Check if entry not in file
-    if entry not in data:
-        print(f"Entry '{entry}' not found in {activemessagesids_path}.")
-        raise KeyError(f"Entry '{entry}' not found in {activemessagesids_path}.")
-
-    return data[entry]
-
-
-def set_active_messages_id(activemessagesids_path, entry, messages_id=None):
-    # Check if the file exists
-    if not Path(activemessagesids_path).is_file():
-        print(f"File {activemessagesids_path} does not exist. Creating a new file.")
-
-        # Create the file if it doesn't exist
-        with open(activemessagesids_path, "w") as file:
-            json.dump({}, file, indent=4)
-
-        return None
-
-    # Read the JSON file
-    data = {}
-    with open(activemessagesids_path, "r") as file:
-        data = json.load(file)
-
-    # Update the entry with new messages_ids
-    if messages_id is not None:
-        data[entry] = messages_id
-    elif entry in data:
-        data.pop(entry)
-
-    # Write back to the JSON file
-    with open(activemessagesids_path, "w") as file:
-        json.dump(data, file, indent=4)
-
-
 def format_mos(user_roles, mos_roles):
     user_mos_roles = []
     user_role_names = [role.name for role in user_roles]
@@ -0,0 +1,86 @@
+import discord
+from discord.ui import View
+
+
+def keyset_next_cursor(rows, cursor):
+    # Rows are ordered by id descending; the next page starts below the last id shown
+    return rows[-1][0]
+
+
+def offset_next_cursor(rows, cursor):
+    # For orderings without a stable key (e.g. search rank); the cursor is a row offset
+    return (cursor or 0) + len(rows)
+
+
+class PaginatorView(View):
+    """
+    Pages through database rows as embeds with Previous/Next buttons.
+
+    fetch_page(cursor, limit) returns up to limit rows starting at cursor (None for the first page).
+    One extra row is requested to know whether a next page exists, and the cursor of every page
+    visited is remembered so Previous does not need to run the query backwards.
+    make_embed(rows, page_number) renders a page.
+    next_cursor(rows, cursor) derives the cursor of the following page; defaults to keyset
+    pagination on the row id in the first column, offset_next_cursor pages by row offset.
+    """
+
+    def __init__(
+        self,
+        owner_id,
+        fetch_page,
+        make_embed,
+        page_size=10,
+        next_cursor=keyset_next_cursor,
+        timeout=300,
+    ):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.fetch_page = fetch_page
+        self.make_embed = make_embed
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+
+        self.cursors = [None]
+        self.page = 0
+        self.has_next = False
+
+    async def render(self):
+        rows = await self.fetch_page(self.cursors[self.page], self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if self.has_next and len(self.cursors) == self.page + 1:
+            self.cursors.append(self.next_cursor(rows, self.cursors[self.page]))
+
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = not self.has_next
+
+        return self.make_embed(rows, self.page + 1)
+
+    async def send(self, interaction, ephemeral=False):
+        embed = await self.render()
+        await interaction.response.send_message(
+            embed=embed, view=self, ephemeral=ephemeral
+        )
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message(
+                "Only the user who ran the command can change pages.", ephemeral=True
+            )
+            return False
+
+        return True
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction, button):
+        self.page = max(self.page - 1, 0)
+        embed = await self.render()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction, button):
+        if self.has_next:
+            self.page += 1
+        embed = await self.render()
+        await interaction.response.edit_message(embed=embed, view=self)